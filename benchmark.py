@@ -0,0 +1,311 @@
+'''Performance benchmarks for stringly.
+
+Usage: python benchmark.py [--save FILE] [--compare FILE] [--tolerance F] [name ...]
+
+Runs all benchmarks, or only those whose name is listed, and prints the time
+per operation, the throughput in serialized megabytes per second and the peak
+memory allocated during a single operation. The workloads are synthetic and
+generated from a fixed seed, such that results are reproducible. With --save
+the results are written to a JSON file; with --compare they are checked
+against such a file, and the exit status is nonzero if any measurement is
+slower than the baseline by more than the tolerance (default 0.2, i.e. 20%).'''
+
+import argparse
+import concurrent.futures
+import dataclasses
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import stringly
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+import typing
+
+results: typing.Dict[str, typing.Dict[str, float]] = {}
+
+
+def measure(f: typing.Callable[[], typing.Any], repeat: int = 5) -> float:
+    'Return the best time per call of `f` in seconds.'
+
+    number, _ = timeit.Timer(f).autorange()
+    return min(timeit.repeat(f, number=number, repeat=repeat)) / number
+
+
+def peakmemory(f: typing.Callable[[], typing.Any]) -> int:
+    'Return the peak memory in bytes allocated during a call of `f`.'
+
+    f() # populate caches
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(name: str, seconds: float, *, size: typing.Optional[int] = None, peak: typing.Optional[int] = None) -> None:
+    result = {'seconds': seconds}
+    line = f'  {name:40s} {seconds*1e6:12.2f} us'
+    if size is not None:
+        result['throughput'] = size / seconds
+        line += f' {size/seconds/1e6:8.2f} MB/s'
+    if peak is not None:
+        result['peak'] = peak
+        line += f' {peak/1e3:10.1f} kB'
+    results[f'{current}/{name}'] = result
+    print(line)
+
+
+def workload(name: str, t: typing.Any, values: typing.Sequence[typing.Any], *, pretty: bool = False) -> None:
+    'Report the dumps and loads performance of a list of values of type `t`.'
+
+    strings = [stringly.dumps(t, v, pretty=pretty) for v in values]
+    assert [stringly.loads(t, s, pretty=pretty) for s in strings] == list(values)
+    size = sum(map(len, strings))
+    dumps = lambda: [stringly.dumps(t, v, pretty=pretty) for v in values]
+    loads = lambda: [stringly.loads(t, s, pretty=pretty) for s in strings]
+    report(f'{name} dumps', measure(dumps, repeat=3), size=size, peak=peakmemory(dumps))
+    report(f'{name} loads', measure(loads, repeat=3), size=size, peak=peakmemory(loads))
+
+
+@dataclasses.dataclass
+class Wide:
+    a: int = 1
+    b: float = 2.5
+    c: str = 'three'
+    d: bool = True
+    e: typing.Tuple[int, ...] = (1, 2, 3)
+    f: typing.Dict[str, int] = dataclasses.field(default_factory=lambda: {'x': 1, 'y': 2})
+    g: typing.Optional[str] = None
+    h: complex = 1j
+
+
+def _uncompiled_dumps(self: typing.Any, v: typing.Any) -> str:
+    # Reference implementation of `Generic.dumps` prior to compiled dump plans.
+    if hasattr(self.cls, '__getnewargs_ex__'):
+        args, kwargs = self.cls.__getnewargs_ex__(v)
+        args += tuple(kwargs[name] for name in self.argnames[len(args):])
+    elif hasattr(self.cls, '__getnewargs__'):
+        args = self.cls.__getnewargs__(v)
+    elif dataclasses.is_dataclass(self.cls):
+        args = tuple(getattr(v, name) for name in self.argnames)
+    dumps = [serializer.dumps(arg) for serializer, arg in zip(self.serializers, args)]
+    return ','.join(stringly.util.protect_regex(dumps[i], ',') if i < self.npositional
+      else stringly.util.protect_regex(self.argnames[i], ',|=') + '=' + stringly.util.protect_regex(dumps[i], ',') for i in range(len(self.argnames)))
+
+
+@dataclasses.dataclass
+class Point:
+    x: float
+    y: float
+
+
+def bench_scalars() -> None:
+    rng = random.Random(0)
+    workload('int (1000 items)', int, [rng.randrange(-10**9, 10**9) for i in range(1000)])
+    workload('float (1000 items)', float, [rng.uniform(-1e3, 1e3) for i in range(1000)])
+    workload('complex (1000 items)', complex, [complex(rng.random(), rng.random()) for i in range(1000)])
+    workload('bool (1000 items)', bool, [rng.random() < .5 for i in range(1000)])
+    workload('str (1000 items)', str, [''.join(rng.choices('abc{},= ', k=20)) for i in range(1000)])
+
+
+def bench_wide() -> None:
+    rng = random.Random(0)
+    workload('Wide (1000 items)', Wide, [Wide(a=i, b=rng.random(), c=f'item {i}') for i in range(1000)])
+
+
+def bench_deep() -> None:
+    for depth in 10, 100:
+        t: typing.Any = int
+        v: typing.Any = [1, 2, 3]
+        for i in range(depth):
+            t = typing.List[t]
+            v = [v]
+        t = typing.List[t]
+        for i in range(depth):
+            t = typing.Dict[str, t]
+            v = {'a': v}
+        workload(f'depth {2*depth+1} (10 items)', t, [v] * 10)
+
+
+def bench_large() -> None:
+    rng = random.Random(0)
+    workload('List[int] (100000 items)', typing.List[int], [[rng.randrange(10**6) for i in range(100000)]])
+    workload('Dict[str,float] (10000 items)', typing.Dict[str, float], [{f'key{i}': rng.random() for i in range(10000)}])
+    workload('List[Point] (10000 items)', typing.List[Point], [[Point(rng.random(), rng.random()) for i in range(10000)]])
+
+
+def bench_array() -> None:
+    try:
+        import numpy
+    except ImportError:
+        print('  skipped: numpy is not installed')
+        return
+    v = numpy.random.default_rng(0).standard_normal(100000)
+    s = stringly.dumps(numpy.ndarray, v)
+    report('ndarray (100000 items) dumps', measure(lambda: stringly.dumps(numpy.ndarray, v), repeat=3), size=len(s))
+    report('ndarray (100000 items) loads', measure(lambda: stringly.loads(numpy.ndarray, s), repeat=3), size=len(s))
+    workload('Tuple[float, ...] (100000 items)', typing.Tuple[float, ...], [tuple(v.tolist())])
+
+
+def bench_union() -> None:
+    rng = random.Random(0)
+    candidates = [lambda: rng.randrange(100), lambda: rng.random(), lambda: f'str{rng.randrange(100)}']
+    workload('Union[int,float,str] (1000 items)', typing.Union[int, float, str], [rng.choice(candidates)() for i in range(1000)])
+    workload('Optional[int] (1000 items)', typing.Optional[int], [rng.randrange(100) if rng.random() < .5 else None for i in range(1000)])
+
+
+def bench_pretty() -> None:
+    rng = random.Random(0)
+    workload('Wide pretty (1000 items)', Wide, [Wide(a=i, b=rng.random(), c=f'item {i}') for i in range(1000)], pretty=True)
+    workload('List[Wide] pretty (100 items)', typing.List[Wide], [[Wide(a=i) for i in range(100)]], pretty=True)
+
+
+def bench_memory() -> None:
+    # Memory held by the serializers of many distinct plugin types, each with
+    # a mix of scalar and container arguments.
+    fields = [('a', int), ('b', float), ('c', str), ('d', bool), ('e', typing.List[int]), ('f', typing.Optional[float])]
+    types = [dataclasses.make_dataclass(f'Plugin{i}', fields) for i in range(1000)]
+    stringly.serializer.cache_clear()
+    stringly.serializer.get(int) # import and intern the scalars
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    serializers = [stringly.serializer._get(t) for t in types]
+    seconds = time.perf_counter() - t0
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    report('1000 plugin serializers (retained)', seconds, peak=size)
+
+
+def bench_generic_dumps() -> None:
+    serializer = stringly.serializer.get(Wide)
+    values = [Wide(a=i, c=f'item {i}') for i in range(1000)]
+    assert all(serializer.dumps(v) == _uncompiled_dumps(serializer, v) for v in values)
+    report('uncompiled (1000 items)', measure(lambda: [_uncompiled_dumps(serializer, v) for v in values]))
+    report('compiled plan (1000 items)', measure(lambda: [serializer.dumps(v) for v in values]))
+
+
+def bench_parallel() -> None:
+    values = [Wide(a=i, c=f'item {i}') for i in range(20000)]
+    strings = stringly.dumps_many(Wide, values)
+    t0 = time.perf_counter()
+    stringly.loads_many(Wide, strings)
+    report('loads_many sequential (20000 items)', time.perf_counter() - t0)
+    nworkers = 1
+    while nworkers <= (os.cpu_count() or 1):
+        with concurrent.futures.ProcessPoolExecutor(nworkers) as executor:
+            stringly.loads_many(Wide, strings[:nworkers], executor=executor, chunksize=1) # start workers
+            t0 = time.perf_counter()
+            stringly.loads_many(Wide, strings, executor=executor, chunksize=4096)
+            report(f'loads_many {nworkers} processes', time.perf_counter() - t0)
+        nworkers *= 2
+
+
+def _isnonnegativebalanced(s: str) -> bool:
+    depths = tuple(itertools.accumulate(1 if b == '{' else -1 for b in re.findall('[{}]', s)))
+    return not depths or all(depth >= 0 for depth in depths) and depths[-1] == 0
+
+
+def _reference_prettify(s: str, indent: str = '') -> str:
+    # Reference implementation of `util.prettify` prior to the tokenized scan.
+    pretty = ''
+    for part in stringly.util.safesplit(s, ','):
+        i = part.find('{')
+        if i > 0 and part.endswith('}') and _isnonnegativebalanced(part[i+1:-1]):
+            scope = _reference_prettify(part[i+1:-1], indent+'  ')
+            part = part[:i]
+        else:
+            scope = ''
+        if part.startswith((' ', '>|')) or '\n' in part:
+            pretty += indent+'>|'+part.replace('\n', '\n'+indent+' |')
+        else:
+            pretty += indent+part
+        pretty += '\n'+scope
+    return pretty
+
+
+def bench_prettify() -> None:
+    # The time per byte of pretty output should be constant if prettify and
+    # deprettify scale linearly. Note that the pretty size grows quadratically
+    # with depth due to indentation. The reference implementation shows the
+    # speedup relative to the recursive prettify.
+    for depth in 50, 100, 200, 400:
+        s = 'a={'*depth + 'b,c' + '}'*depth
+        pretty = stringly.util.prettify(s)
+        assert _reference_prettify(s) == pretty
+        report(f'prettify depth {depth} (per kB)', measure(lambda: stringly.util.prettify(s), repeat=3) * 1e3 / len(pretty))
+        report(f'reference prettify depth {depth} (per kB)', measure(lambda: _reference_prettify(s), repeat=3) * 1e3 / len(pretty))
+        report(f'deprettify depth {depth} (per kB)', measure(lambda: stringly.util.deprettify(pretty), repeat=3) * 1e3 / len(pretty))
+    for width in 1000, 10000, 100000:
+        s = ','.join(f'k{i}={{x={i},y={{1,2}}}}' for i in range(width))
+        pretty = stringly.util.prettify(s)
+        assert _reference_prettify(s) == pretty
+        report(f'prettify width {width} (per kB)', measure(lambda: stringly.util.prettify(s), repeat=3) * 1e3 / len(pretty))
+        report(f'reference prettify width {width} (per kB)', measure(lambda: _reference_prettify(s), repeat=3) * 1e3 / len(pretty))
+        report(f'deprettify width {width} (per kB)', measure(lambda: stringly.util.deprettify(pretty), repeat=3) * 1e3 / len(pretty))
+
+
+def bench_import() -> None:
+    # Import times as reported by `python -X importtime`, best of 10 fresh
+    # interpreters, excluding the cost of starting the interpreter itself. The
+    # first use includes all modules that are imported on demand by `loads`.
+    def importtime(source: str, *modules: str) -> float:
+        times = []
+        for i in range(10):
+            p = subprocess.run([sys.executable, '-X', 'importtime', '-c', source], cwd=os.path.dirname(os.path.abspath(__file__)),
+              stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+            times.append(sum(int(line.split('|')[1]) for line in p.stderr.splitlines()[1:]
+              if line.startswith('import time:') and line.split('|')[2].strip() in modules))
+        return min(times) * 1e-6
+    report('import stringly', importtime('import stringly', 'stringly'))
+    report('import stringly.serializer', importtime('import stringly.serializer', 'stringly.serializer'))
+    report('first use (import stringly; loads)', importtime('import stringly; stringly.loads(int, "1")', 'stringly', 'stringly.serializer'))
+
+
+def compare(baseline: typing.Mapping[str, typing.Mapping[str, float]], tolerance: float) -> bool:
+    'Print the timings relative to the baseline and return whether any regressed.'
+
+    regressed = False
+    print('comparison with baseline')
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result['seconds'] / baseline[name]['seconds']
+            flag = ratio > 1 + tolerance
+            regressed |= flag
+            print(f'  {name:60s} {ratio:6.2f}x{"  REGRESSION" if flag else ""}')
+    return regressed
+
+
+def main(names: typing.Sequence[str], save: typing.Optional[str] = None, baseline: typing.Optional[str] = None, tolerance: float = .2) -> int:
+    global current
+    for name, bench in list(globals().items()):
+        if name.startswith('bench_') and (not names or name[6:] in names):
+            print(name[6:])
+            current = name[6:]
+            bench()
+    if save:
+        with open(save, 'w') as f:
+            json.dump(dict(python=platform.python_version(), stringly=stringly.__version__, platform=platform.platform(), results=results), f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            if compare(json.load(f)['results'], tolerance):
+                return 1
+    return 0
+
+
+current = ''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Performance benchmarks for stringly.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--save', metavar='FILE', help='write the results to a JSON file')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results against a JSON file written by --save')
+    parser.add_argument('--tolerance', type=float, default=.2, help='relative slowdown that counts as a regression (default: 0.2)')
+    args = parser.parse_args()
+    sys.exit(main(args.names, args.save, args.compare, args.tolerance))
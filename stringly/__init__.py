@@ -36,27 +36,272 @@ __version__ = '1.0b3'
 
 
 import typing
-from . import util, serializer, proto
+
+if typing.TYPE_CHECKING:
+    import concurrent.futures
+    from . import util, serializer, proto, error, compiler, schemacache, instrument, document, cli
+    from .document import Document
 
 T = typing.TypeVar('T')
 
+# The submodules are imported on first use rather than by `import stringly`,
+# as the serializer in particular pulls in a considerable part of the standard
+# library, which dominates the startup time of short lived command line tools.
+_submodules = frozenset(['util', 'serializer', 'proto', 'error', 'compiler', 'schemacache', 'instrument', 'document', 'cli'])
+_attributes = {'Document': 'document'}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name in _submodules:
+        import importlib
+        return importlib.import_module(f'{__name__}.{name}')
+    if name in _attributes:
+        return getattr(__getattr__(_attributes[name]), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__() -> typing.List[str]:
+    return sorted(set(globals()) | _submodules | set(_attributes))
+
+
+def _get(t: typing.Type[T]) -> 'proto.Serializer[T]':
+    # Replaces itself by `serializer.get` on first use, such that the import
+    # adds no overhead to subsequent calls.
+    global _get
+    from .serializer import get as _get
+    return _get(t)
+
 
 def loads(t: typing.Type[T], s: str, *, pretty: bool = False) -> T:
     if pretty:
+        from . import util
         s = util.deprettify(s)
-    return serializer.get(t).loads(s)
+    return _get(t).loads(s)
 
 
 def dumps(t: typing.Type[T], v: T, *, pretty: bool = False) -> str:
-    s = serializer.get(t).dumps(v)
+    s = _get(t).dumps(v)
     if pretty:
+        from . import util
         s = util.prettify(s)
     return s
 
 
-def load(t: typing.Type[T], f: proto.SupportsRead, *, pretty: bool = False) -> T:
+def loads_many(t: typing.Type[T], strings: typing.Iterable[str], *, pretty: bool = False, executor: typing.Optional['concurrent.futures.Executor'] = None, chunksize: int = 1024) -> typing.List[T]:
+    if executor is not None:
+        return _mapchunks(executor, _loads_chunk, t, strings, pretty, chunksize)
+    return _loads_chunk(t, strings, pretty, 0)
+
+
+def dumps_many(t: typing.Type[T], values: typing.Iterable[T], *, pretty: bool = False, executor: typing.Optional['concurrent.futures.Executor'] = None, chunksize: int = 1024) -> typing.List[str]:
+    if executor is not None:
+        return _mapchunks(executor, _dumps_chunk, t, values, pretty, chunksize)
+    return _dumps_chunk(t, values, pretty, 0)
+
+
+def _loads_chunk(t: typing.Type[T], strings: typing.Iterable[str], pretty: bool, offset: int) -> typing.List[T]:
+    from . import util, error
+    loadnode = _get(t).loadnode
+    values = []
+    for i, s in enumerate(strings, start=offset):
+        try:
+            values.append(loadnode(util.tokenize(util.deprettify(s) if pretty else s)))
+        except error.SerializationError as e:
+            raise error.ItemSerializationError(i, e) from e
+    return values
+
+
+def _dumps_chunk(t: typing.Type[T], values: typing.Iterable[T], pretty: bool, offset: int) -> typing.List[str]:
+    from . import util, error
+    dumps = _get(t).dumps
+    strings = []
+    for i, v in enumerate(values, start=offset):
+        try:
+            s = dumps(v)
+        except error.SerializationError as e:
+            raise error.ItemSerializationError(i, e) from e
+        strings.append(util.prettify(s) if pretty else s)
+    return strings
+
+
+def _mapchunks(executor: 'concurrent.futures.Executor', f: typing.Callable[[typing.Any, typing.List[typing.Any], bool, int], typing.List[typing.Any]], t: typing.Any, items: typing.Iterable[typing.Any], pretty: bool, chunksize: int) -> typing.List[typing.Any]:
+    # Every chunk carries the type rather than its serializer: types pickle by
+    # reference, and workers resolve the serializer from their own cache. The
+    # results are collected in submission order, such that the first failing
+    # item is reported as in the sequential case.
+    import itertools
+    it = iter(items)
+    futures = []
+    offset = 0
+    while True:
+        chunk = list(itertools.islice(it, chunksize))
+        if not chunk:
+            break
+        futures.append(executor.submit(f, t, chunk, pretty, offset))
+        offset += len(chunk)
+    results = []
+    try:
+        for future in futures:
+            results.extend(future.result())
+    finally:
+        for future in futures:
+            future.cancel()
+    return results
+
+
+def compile(t: typing.Type[T]) -> 'compiler.Compiled[T]':
+    from . import compiler
+    return compiler.compile(t)
+
+
+def profile() -> 'instrument.Profiler':
+    from . import instrument
+    return instrument.Profiler()
+
+
+def load(t: typing.Type[T], f: 'proto.SupportsRead', *, pretty: bool = False) -> T:
     return loads(t, f.read(), pretty=pretty)
 
 
-def dump(t: typing.Type[T], v: T, f: proto.SupportsWrite, *, pretty: bool = False) -> None:
-    f.write(dumps(t, v, pretty=pretty))
+def iterload(t: typing.Any, f: 'proto.SupportsReadChunk', *, chunksize: int = 65536) -> typing.Iterator[typing.Any]:
+    from . import serializer, util
+    s = serializer.get(t)
+    if not isinstance(s, (serializer.Sequence, serializer.UniformTuple, serializer.Dict)):
+        raise ValueError(f'cannot iteratively load {s}')
+    splitter = util.Splitter(',')
+    for chunk in iter(lambda: f.read(chunksize), ''):
+        for part in splitter.feed(chunk):
+            yield s.loaditem(util.tokenize(part))
+    for part in splitter.close():
+        yield s.loaditem(util.tokenize(part))
+
+
+def dump(t: typing.Type[T], v: T, f: 'proto.SupportsWrite', *, pretty: bool = False) -> None:
+    for part in _dumpparts(t, v, pretty):
+        f.write(part)
+
+
+def _dumpparts(t: typing.Type[T], v: T, pretty: bool) -> typing.Iterator[str]:
+    from . import serializer, util
+    s = serializer.get(t)
+    if isinstance(s, (serializer.Sequence, serializer.UniformTuple, serializer.Dict)):
+        # Generate the top level items one by one, which is equivalent to
+        # joining them by commas, while prettify acts on top level items
+        # independently.
+        sep = ''
+        for item in v.items() if isinstance(s, serializer.Dict) else v: # type: ignore
+            part = s.dumpitem(item)
+            yield util.prettify(part) if pretty else sep + part
+            sep = ','
+    else:
+        yield dumps(t, v, pretty=pretty)
+
+
+async def aload(t: typing.Type[T], f: 'proto.SupportsAsyncRead', *, pretty: bool = False, executor: typing.Optional['concurrent.futures.Executor'] = None, chunksize: int = 65536, encoding: str = 'utf-8') -> T:
+    import asyncio
+    import functools
+    from . import serializer
+    s = serializer.get(t)
+    if not pretty and isinstance(s, (serializer.Sequence, serializer.UniformTuple, serializer.Dict)):
+        items = [item async for item in aiterload(t, f, executor=executor, chunksize=chunksize, encoding=encoding)]
+        if isinstance(s, serializer.Sequence):
+            return s.origin(items) # type: ignore
+        return tuple(items) if isinstance(s, serializer.UniformTuple) else dict(items)
+    # Other values are loaded in one go, which is delegated to the executor, or
+    # to the default executor of the loop, so as not to block the loop.
+    text = ''.join([chunk async for chunk in _areadchunks(f, chunksize, encoding)])
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(loads, t, text, pretty=pretty))
+
+
+async def aiterload(t: typing.Any, f: 'proto.SupportsAsyncRead', *, executor: typing.Optional['concurrent.futures.Executor'] = None, chunksize: int = 65536, encoding: str = 'utf-8') -> typing.AsyncIterator[typing.Any]:
+    import asyncio
+    from . import serializer, util
+    s = serializer.get(t)
+    if not isinstance(s, (serializer.Sequence, serializer.UniformTuple, serializer.Dict)):
+        raise ValueError(f'cannot iteratively load {s}')
+    # The items completed by every chunk are deserialized in one go, either in
+    # the executor or in the event loop followed by a yield of control, such
+    # that the loop is blocked for at most the deserialization of one chunk.
+    loop = asyncio.get_running_loop()
+    splitter = util.Splitter(',')
+    chunks = _areadchunks(f, chunksize, encoding)
+    done = False
+    while not done:
+        try:
+            parts = splitter.feed(await chunks.__anext__())
+        except StopAsyncIteration:
+            parts = splitter.close()
+            done = True
+        if not parts:
+            continue
+        if executor is None:
+            items = _loaditems(t, parts)
+            await asyncio.sleep(0)
+        else:
+            items = await loop.run_in_executor(executor, _loaditems, t, parts)
+        for item in items:
+            yield item
+
+
+def _loaditems(t: typing.Any, parts: typing.List[str]) -> typing.List[typing.Any]:
+    from . import serializer, util
+    s = serializer.get(t)
+    return [s.loaditem(util.tokenize(part)) for part in parts] # type: ignore
+
+
+async def _areadchunks(f: 'proto.SupportsAsyncRead', chunksize: int, encoding: str) -> typing.AsyncIterator[str]:
+    # Binary streams are decoded incrementally, as a chunk may end halfway a
+    # multibyte character.
+    import codecs
+    decoder = None
+    while True:
+        chunk = await f.read(chunksize)
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding)()
+            text = decoder.decode(chunk, final=not chunk)
+        else:
+            text = chunk
+        if text:
+            yield text
+        if not chunk:
+            break
+
+
+async def adump(t: typing.Type[T], v: T, f: 'proto.SupportsAsyncWrite', *, pretty: bool = False, executor: typing.Optional['concurrent.futures.Executor'] = None, chunksize: int = 65536, encoding: typing.Optional[str] = 'utf-8') -> None:
+    import asyncio
+    import functools
+    from . import serializer
+    # Without an executor only containers are dumped in the loop, item by item;
+    # other values are dumped in one go by the default executor of the loop.
+    if executor is None and isinstance(serializer.get(t), (serializer.Sequence, serializer.UniformTuple, serializer.Dict)):
+        parts: typing.Iterable[str] = _dumpparts(t, v, pretty)
+    else:
+        text = await asyncio.get_running_loop().run_in_executor(executor, functools.partial(dumps, t, v, pretty=pretty))
+        parts = [text[i:i+chunksize] for i in range(0, len(text), chunksize)]
+    # Parts are buffered up to `chunksize` characters and encoded, unless
+    # `encoding` is None for text writers. After every write the writer is
+    # drained, if supported, and control is yielded to the loop.
+    buffered: typing.List[str] = []
+    size = 0
+    for part in parts:
+        buffered.append(part)
+        size += len(part)
+        if size >= chunksize:
+            await _awrite(f, ''.join(buffered), encoding)
+            buffered = []
+            size = 0
+    if buffered:
+        await _awrite(f, ''.join(buffered), encoding)
+
+
+async def _awrite(f: 'proto.SupportsAsyncWrite', s: str, encoding: typing.Optional[str]) -> None:
+    import asyncio
+    import inspect
+    result = f.write(s if encoding is None else s.encode(encoding))
+    if inspect.isawaitable(result):
+        await result
+    drain = getattr(f, 'drain', None)
+    if drain is not None:
+        await drain()
+    await asyncio.sleep(0)
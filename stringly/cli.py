@@ -0,0 +1,121 @@
+'''Command line parsing based on Generic serializers.
+
+The arguments of a callable are set from the command line by entries of the
+form `name=value`, `--name=value` or `--name value`, where every value is
+deserialized by the serializer of the corresponding argument. A bare word
+selects a preset from the `.. presets::` directive of the docstring, whose
+values can be overridden by subsequent entries. Arguments that are not set
+take their default, either from the signature or from the `.. arguments::`
+directive of the docstring.
+
+Serializers are resolved once per callable, through the cache of
+`serializer.get`, and the help text is formatted only when requested.'''
+
+import inspect
+import os
+import sys
+import typing
+from . import error, serializer, util
+
+T = typing.TypeVar('T')
+
+
+def parse(f: typing.Callable[..., typing.Any], argv: typing.Sequence[str]) -> typing.Dict[str, typing.Any]:
+    'Return the arguments of `f` as set by `argv`.'
+
+    s = _generic(f)
+    index = {name: i for i, name in enumerate(s.argnames)}
+    strings: typing.Dict[int, str] = {}
+    it = iter(argv)
+    for arg in it:
+        name, sep, value = arg[2:].partition('=') if arg.startswith('--') else arg.partition('=')
+        if sep:
+            pass
+        elif arg.startswith('--'):
+            value = next(it, None) # type: ignore
+            if value is None:
+                raise error.SerializationError(f'missing value for argument {name!r}')
+        else:
+            presets = util.DocString(f).presets
+            if name not in presets:
+                raise error.SerializationError(f'unknown preset {name!r}')
+            for presetname, value in presets[name].items():
+                if presetname not in index:
+                    raise error.SerializationError(f'preset {name!r} sets invalid argument {presetname!r}')
+                strings[index[presetname]] = value
+            continue
+        if name not in index:
+            raise error.SerializationError(f'invalid argument {name!r}')
+        strings[index[name]] = value
+    values = {}
+    for i, name in enumerate(s.argnames):
+        try:
+            if i in strings:
+                values[name] = s.serializers[i].loads(strings[i])
+            elif s.defaults[i] is inspect.Parameter.empty:
+                raise error.SerializationError('missing mandatory argument')
+            elif isinstance(s.defaults[i], serializer._strarg):
+                values[name] = s._loaddefault(i, s.defaults[i])
+            else:
+                values[name] = s.defaults[i]
+        except error.SerializationError as e:
+            raise error.SerializationError(f'argument {name!r}: {e}') from e
+    return values
+
+
+def run(f: typing.Callable[..., T], argv: typing.Optional[typing.Sequence[str]] = None, *, prog: typing.Optional[str] = None) -> T:
+    '''Call `f` with the arguments set by `argv`, which defaults to the command
+    line arguments. Prints the help text and exits if `argv` contains `-h` or
+    `--help`, or prints the error and exits with status 2 if parsing fails.'''
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if prog is None:
+        prog = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else getattr(f, '__name__', 'prog')
+    if '-h' in argv or '--help' in argv:
+        print(helptext(f, prog))
+        raise SystemExit(0)
+    try:
+        values = parse(f, argv)
+    except error.SerializationError as e:
+        print(f'{prog}: error: {e}', file=sys.stderr)
+        raise SystemExit(2)
+    s = _generic(f)
+    return f(*[values[name] for name in s.argnames[:s.npositional]], **{name: values[name] for name in s.argnames[s.npositional:]})
+
+
+def helptext(f: typing.Callable[..., typing.Any], prog: str) -> str:
+    'Return the help text for the arguments of `f`.'
+
+    s = _generic(f)
+    doc = util.DocString(f)
+    lines = [f'usage: {prog} [preset] [--name=value ...]' if doc.presets else f'usage: {prog} [--name=value ...]']
+    if doc.text:
+        lines.extend(['', doc.text])
+    if doc.presets:
+        lines.extend(['', 'presets:'])
+        lines.extend(f'  {name}' for name in doc.presets)
+    lines.extend(['', 'arguments:'])
+    for i, name in enumerate(s.argnames):
+        default = s.defaults[i]
+        if isinstance(default, serializer._strarg):
+            lines.append(f'  --{name}={s.serializers[i]} [{default.value}]')
+        elif default is inspect.Parameter.empty:
+            lines.append(f'  --{name}={s.serializers[i]} (mandatory)')
+        else:
+            try:
+                lines.append(f'  --{name}={s.serializers[i]} [{s.serializers[i].dumps(default)}]')
+            except error.SerializationError:
+                lines.append(f'  --{name}={s.serializers[i]} [{default!r}]')
+        argdoc = doc.argdocs.get(name)
+        if argdoc:
+            lines.extend('      ' + line for line in argdoc.splitlines())
+    return '\n'.join(lines)
+
+
+def _generic(f: typing.Callable[..., typing.Any]) -> 'serializer.Generic[typing.Any]':
+    s = serializer.get(f)
+    if not isinstance(s, serializer.Generic):
+        raise ValueError(f'cannot parse command line arguments for {s}')
+    return s
+
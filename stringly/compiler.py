@@ -0,0 +1,340 @@
+import builtins
+import inspect
+import itertools
+import linecache
+import typing
+from . import proto, serializer, util, error
+
+T = typing.TypeVar('T')
+
+# Maximum block nesting depth of inlined code, after which a serializer is
+# generated as a separate function to stay clear of Python's limit of 20
+# statically nested blocks.
+_maxdepth = 12
+
+
+def compile(t: typing.Type[T]) -> 'Compiled[T]':
+    return Compiled(serializer.get(t))
+
+
+class Compiled(typing.Generic[T]):
+    '''Serializer that is generated as Python source from an interpreted
+    serializer tree, with all nested serializers inlined. The generated code is
+    available as the `source` attribute.'''
+
+    def __init__(self, interpreted: proto.Serializer[T]) -> None:
+        self.interpreted = interpreted
+        generator = _Generator()
+        self.source = generator.module(interpreted)
+        filename = f'<stringly.compile {interpreted}>'
+        linecache.cache[filename] = len(self.source), None, self.source.splitlines(True), filename
+        exec(builtins.compile(self.source, filename, 'exec'), generator.namespace)
+        self.loadnode: typing.Callable[[util.Node], T] = generator.namespace['loadnode']
+        self.loads: typing.Callable[[str], T] = generator.namespace['loads']
+        self.dumps: typing.Callable[[T], str] = generator.namespace['dumps']
+
+    def __str__(self) -> str:
+        return str(self.interpreted)
+
+
+class _Generator:
+
+    def __init__(self) -> None:
+        self.namespace: typing.Dict[str, typing.Any] = dict(
+            _SerializationError=error.SerializationError,
+            _tokenize=util.tokenize,
+            _Node=util.Node,
+            _strarg=serializer._strarg,
+            _empty=inspect.Parameter.empty,
+            _assert_isinstance=serializer._assert_isinstance,
+            _protectitem=serializer._protectitem,
+            _protectkey=serializer._protectkey,
+            _protect_unconditionally=util.protect_unconditionally,
+            _protect_unbalanced=util.protect_unbalanced,
+            _booleans=serializer._booleans)
+        self.functions: typing.List[str] = []
+        self.counter = itertools.count()
+        self.constants: typing.Dict[int, str] = {}
+        self.loadfunctions: typing.Dict[int, str] = {}
+        self.dumpfunctions: typing.Dict[int, str] = {}
+
+    def module(self, z: proto.Serializer[typing.Any]) -> str:
+        loadnode = '\n'.join(['def loadnode(n):', '    text = n.tokens.text', *self.load(z, 'n', 'r', '    '), '    return r'])
+        dumps = '\n'.join(['def dumps(v):', *self.dump(z, 'v', 'r', '    '), '    return r'])
+        loads = 'def loads(s):\n    return loadnode(_tokenize(s))'
+        return '\n\n'.join([*self.functions, loadnode, loads, dumps]) + '\n'
+
+    def var(self, prefix: str) -> str:
+        return f'{prefix}{next(self.counter)}'
+
+    def const(self, value: typing.Any, prefix: str = '_c') -> str:
+        try:
+            return self.constants[id(value)]
+        except KeyError:
+            name = self.constants[id(value)] = self.var(prefix)
+            self.namespace[name] = value
+            return name
+
+    def load(self, z: proto.Serializer[typing.Any], n: str, r: str, indent: str) -> typing.List[str]:
+        'Generate statements that load node `n` into variable `r`.'
+
+        if isinstance(z, (serializer.Native, serializer.Boolean, serializer.Enum, serializer.Custom)):
+            s = f'text[{n}.start:{n}.end]'
+            if isinstance(z, serializer.Native):
+                return [f'{indent}try:',
+                        f'{indent}    {r} = {self.const(z.T)}({s})',
+                        f'{indent}except Exception as e:',
+                        f'{indent}    raise _SerializationError(e)']
+            if isinstance(z, serializer.Boolean):
+                si = self.var('s')
+                return [f'{indent}{si} = {s}',
+                        f'{indent}{r} = _booleans.get({si})',
+                        f'{indent}if {r} is None:',
+                        f'{indent}    {r} = _booleans.get({si}.lower())',
+                        f'{indent}    if {r} is None:',
+                        f'{indent}        raise _SerializationError("invalid boolean value " + repr({si}))']
+            if isinstance(z, serializer.Enum):
+                si, lookup = self.var('s'), self.const(z.lookup)
+                return [f'{indent}{si} = {s}',
+                        f'{indent}{r} = {lookup}.get({si})',
+                        f'{indent}if {r} is None:',
+                        *([f'{indent}    {r} = {lookup}.get({si}.casefold())',
+                           f'{indent}if {r} is None:'] if z.aliases else []),
+                        f'{indent}    raise _SerializationError({f"invalid {z} value "!r} + repr({si}))']
+            return [f'{indent}{r} = {self.const(z.C)}.__stringly_loads__({s})']
+        if len(indent) > 4 * _maxdepth or not isinstance(z, _inlined):
+            return [f'{indent}{r} = {self.loadfunction(z)}(text, {n})']
+        lines = []
+        if isinstance(z, (serializer.Sequence, serializer.UniformTuple)) and isinstance(z.itemserializer, serializer._Number):
+            origin = tuple if isinstance(z, serializer.UniformTuple) else z.origin
+            items = f'{self.const(z.itemserializer)}.loaditems({n})'
+            lines.append(f'{indent}{r} = {items}' if origin is list else f'{indent}{r} = {self.const(origin)}({items})')
+        elif isinstance(z, (serializer.Sequence, serializer.UniformTuple)):
+            items, ni, ri = self.var('items'), self.var('n'), self.var('r')
+            lines += [f'{indent}{items} = []',
+                      f'{indent}for {ni} in {n}.split(","):',
+                      f'{indent}    {ni} = {ni}.unprotect()',
+                      *self.load(z.itemserializer, ni, ri, indent+'    '),
+                      f'{indent}    {items}.append({ri})']
+            origin = tuple if isinstance(z, serializer.UniformTuple) else z.origin
+            lines.append(f'{indent}{r} = {items}' if origin is list else f'{indent}{r} = {self.const(origin)}({items})')
+        elif isinstance(z, serializer.PluriformTuple):
+            parts = self.var('parts')
+            lines += [f'{indent}{parts} = {n}.split(",")',
+                      f'{indent}if len({parts}) != {len(z.itemserializers)}:',
+                      f'{indent}    raise _SerializationError("tuple has incorrect length")']
+            results = []
+            for i, zi in enumerate(z.itemserializers):
+                ni, ri = self.var('n'), self.var('r')
+                lines.append(f'{indent}{ni} = {parts}[{i}].unprotect()')
+                lines += self.load(zi, ni, ri, indent)
+                results.append(ri)
+            lines.append(f'{indent}{r} = ({"".join(ri + ", " for ri in results)})')
+        elif isinstance(z, serializer.Dict):
+            d, ni, parts, nk, rk, nv, rv = self.var('d'), self.var('n'), self.var('parts'), self.var('n'), self.var('r'), self.var('n'), self.var('r')
+            lines += [f'{indent}{d} = {{}}',
+                      f'{indent}for {ni} in {n}.split(","):',
+                      f'{indent}    {parts} = {ni}.split("=", 1)',
+                      f'{indent}    if len({parts}) != 2:',
+                      f'{indent}        raise _SerializationError("missing value")',
+                      f'{indent}    {nk} = {parts}[0].unprotect()',
+                      *self.load(z.keyserializer, nk, rk, indent+'    '),
+                      f'{indent}    {nv} = {parts}[1].unprotect()',
+                      *self.load(z.valueserializer, nv, rv, indent+'    '),
+                      f'{indent}    {d}[{rk}] = {rv}',
+                      f'{indent}{r} = {d}']
+        elif isinstance(z, serializer.Optional):
+            ni = self.var('n')
+            lines += [f'{indent}if {n}.start == {n}.end:',
+                      f'{indent}    {r} = None',
+                      f'{indent}else:',
+                      f'{indent}    {ni} = {n}.unprotect()',
+                      *self.load(z.serializer, ni, r, indent+'    ')]
+        elif isinstance(z, serializer.Union):
+            name, ni = self.var('name'), self.var('n')
+            lines.append(f'{indent}{name}, {ni} = {n}.splitarg()')
+            for i, (key, zi) in enumerate(z.serializers.items()):
+                lines.append(f'{indent}{"elif" if i else "if"} {name} == {key!r}:')
+                lines += self.load(zi, ni, r, indent+'    ')
+            lines += [f'{indent}else:',
+                      f'{indent}    raise _SerializationError("unknown type: " + {name})']
+        elif isinstance(z, serializer.Generic):
+            lines += self.loadgeneric(z, n, r, indent)
+        return lines
+
+    def loadgeneric(self, z: serializer.Generic[typing.Any], n: str, r: str, indent: str) -> typing.List[str]:
+        args = self.var('args')
+        lines = [f'{indent}{args} = {self.const(z.defaults)}.copy()',
+                 f'{indent}if {n}.start == {n}.end:',
+                 f'{indent}    pass',
+                 f'{indent}else:']
+        if len(z.argnames) == 1:
+            ni = n
+            if not z.npositional:
+                parts, name, ni = self.var('parts'), self.var('name'), self.var('n')
+                lines += [f'{indent}    {parts} = {n}.split("=", 1)',
+                          f'{indent}    {name} = text[{parts}[0].start:{parts}[0].end]',
+                          f'{indent}    if len({parts}) != 2 or {name} != {z.argnames[0]!r}:',
+                          f'{indent}        raise _SerializationError("invalid argument " + repr({name}))',
+                          f'{indent}    {ni} = {parts}[1]']
+            lines.append(f'{indent}    {args}[0] = {ni}.unprotect()')
+        else:
+            index, si, parts, key, name = self.var('index'), self.var('n'), self.var('parts'), self.var('n'), self.var('name')
+            lines += [f'{indent}    {index} = 0',
+                      f'{indent}    for {si} in {n}.split(","):',
+                      f'{indent}        {parts} = {si}.split("=", 1)',
+                      f'{indent}        if len({parts}) == 2:',
+                      f'{indent}            {key} = {parts}[0].unprotect()',
+                      f'{indent}            {name} = text[{key}.start:{key}.end]',
+                      f'{indent}            {index} = {self.const(z.argindex)}.get({name}, -1)',
+                      f'{indent}            if {index} < 0:',
+                      f'{indent}                raise _SerializationError("invalid argument " + repr({name}))',
+                      f'{indent}            if isinstance({args}[{index}], _Node):',
+                      f'{indent}                raise _SerializationError("duplicate argument " + repr({name}))',
+                      f'{indent}            {args}[{index}] = {parts}[1].unprotect()',
+                      f'{indent}        elif {index} < {z.npositional}:',
+                      f'{indent}            {args}[{index}] = {si}.unprotect()',
+                      f'{indent}            {index} += 1',
+                      f'{indent}        else:',
+                      f'{indent}            raise _SerializationError("invalid expression")']
+        values = []
+        for i, (argname, zi) in enumerate(zip(z.argnames, z.serializers)):
+            a = self.var('a')
+            lines += [f'{indent}{a} = {args}[{i}]',
+                      f'{indent}if {a} is _empty:',
+                      f'{indent}    raise _SerializationError("missing mantatory argument " + {repr(argname)!r})',
+                      f'{indent}elif isinstance({a}, _Node):',
+                      *self.load(zi, a, a, indent+'    '),
+                      f'{indent}elif isinstance({a}, _strarg):',
+                      f'{indent}    {a} = {self.const(z)}._loaddefault({i}, {a})']
+            values.append(a if i < z.npositional else f'{argname}={a}')
+        lines.append(f'{indent}{r} = {self.const(z.cls)}({", ".join(values)})')
+        return lines
+
+    def loadfunction(self, z: proto.Serializer[typing.Any]) -> str:
+        try:
+            return self.loadfunctions[id(z)]
+        except KeyError:
+            pass
+        name = self.loadfunctions[id(z)] = self.var('_load')
+        if isinstance(z, _inlined):
+            body = self.load(z, 'n', 'r', '    ')
+        else: # serializer that is not known to the generator
+            body = [f'    r = {self.const(z)}.loadnode(n)']
+        self.functions.append('\n'.join([f'def {name}(text, n):', *body, '    return r']))
+        return name
+
+    def dump(self, z: proto.Serializer[typing.Any], v: str, r: str, indent: str) -> typing.List[str]:
+        'Generate statements that dump value `v` into variable `r`.'
+
+        if isinstance(z, serializer.Native):
+            nativetypes = self.const((z.T, *z.alt))
+            lines = [f'{indent}if not isinstance({v}, {nativetypes}):',
+                     f'{indent}    _assert_isinstance({v}, *{nativetypes})',
+                     f'{indent}{r} = str({self.const(z.T)}({v}))']
+            for prefix, suffix in z.trim:
+                lines += [f'{indent}if {r}.startswith({prefix!r}) and {r}.endswith({suffix!r}):',
+                          f'{indent}    {r} = {r}[{len(prefix)}:len({r})-{len(suffix)}]']
+            return lines
+        if isinstance(z, serializer.Boolean):
+            return [f'{indent}if not isinstance({v}, bool):',
+                    f'{indent}    _assert_isinstance({v}, bool)',
+                    f'{indent}{r} = "True" if {v} else "False"']
+        if isinstance(z, serializer.Enum):
+            cls = self.const(z.cls)
+            return [f'{indent}if not isinstance({v}, {cls}):',
+                    f'{indent}    _assert_isinstance({v}, {cls})',
+                    f'{indent}{r} = {v}.name']
+        if isinstance(z, serializer.Custom):
+            return [f'{indent}{r} = {self.const(z.C)}.__stringly_dumps__({v})']
+        if len(indent) > 4 * _maxdepth or not isinstance(z, _inlined):
+            return [f'{indent}{r} = {self.dumpfunction(z)}({v})']
+        lines = []
+        if isinstance(z, (serializer.Sequence, serializer.UniformTuple)) and isinstance(z.itemserializer, serializer._Number):
+            lines.append(f'{indent}{r} = {self.const(z.itemserializer)}.dumpitems({v})')
+        elif isinstance(z, (serializer.Sequence, serializer.UniformTuple)):
+            parts, vi, ri = self.var('parts'), self.var('v'), self.var('r')
+            lines += [f'{indent}{parts} = []',
+                      f'{indent}for {vi} in {v}:',
+                      *self.dump(z.itemserializer, vi, ri, indent+'    '),
+                      f'{indent}    {parts}.append(_protectitem({ri}) or "{{}}")',
+                      f'{indent}{r} = ",".join({parts})']
+        elif isinstance(z, serializer.PluriformTuple):
+            lines += [f'{indent}if len({v}) != {len(z.itemserializers)}:',
+                      f'{indent}    raise _SerializationError("tuple has incorrect length")']
+            if z.itemserializers:
+                values = [self.var('v') for zi in z.itemserializers]
+                lines.append(f'{indent}{"".join(vi + ", " for vi in values)}= {v}')
+                results = []
+                for zi, vi in zip(z.itemserializers, values):
+                    ri = self.var('r')
+                    lines += self.dump(zi, vi, ri, indent)
+                    results.append(f'(_protectitem({ri}) or "{{}}")')
+                lines.append(f'{indent}{r} = ' + ' + "," + '.join(results))
+            else:
+                lines.append(f'{indent}{r} = ""')
+        elif isinstance(z, serializer.Dict):
+            parts, vk, vv, rk, rv = self.var('parts'), self.var('v'), self.var('v'), self.var('r'), self.var('r')
+            lines += [f'{indent}{parts} = []',
+                      f'{indent}for {vk}, {vv} in {v}.items():',
+                      *self.dump(z.keyserializer, vk, rk, indent+'    '),
+                      *self.dump(z.valueserializer, vv, rv, indent+'    '),
+                      f'{indent}    {parts}.append(_protectkey({rk}) + "=" + _protectitem({rv}))',
+                      f'{indent}{r} = ",".join({parts})']
+        elif isinstance(z, serializer.Optional):
+            ri = self.var('r')
+            lines += [f'{indent}if {v} is None:',
+                      f'{indent}    {r} = ""',
+                      f'{indent}else:',
+                      *self.dump(z.serializer, v, ri, indent+'    '),
+                      f'{indent}    {r} = _protect_unconditionally({ri}) if {ri}.startswith("{{") and {ri}.endswith("}}") or not {ri} else {ri}']
+        elif isinstance(z, serializer.Union):
+            # Members are tried in order, skipping those that are known to fail
+            # for the type of `v`, exactly as in `Union.dumps`.
+            lines.append(f'{indent}{r} = None')
+            for name, zi, types in z.dumptypes:
+                ri = self.var('r')
+                condition = f'{r} is None' if types is None else f'{r} is None and isinstance({v}, {self.const(types)})'
+                lines += [f'{indent}if {condition}:',
+                          f'{indent}    try:',
+                          *self.dump(zi, v, ri, indent+'        '),
+                          f'{indent}    except _SerializationError:',
+                          f'{indent}        pass',
+                          f'{indent}    else:',
+                          f'{indent}        {r} = {name!r} + _protect_unconditionally({ri}) if {ri} else {name!r}']
+            lines += [f'{indent}if {r} is None:',
+                      f'{indent}    raise _SerializationError("failed to find matching serializer")']
+        elif isinstance(z, serializer.Generic):
+            cls, args = self.const(z.cls), self.var('args')
+            lines += [f'{indent}if not isinstance({v}, {cls}):',
+                      f'{indent}    _assert_isinstance({v}, {cls})',
+                      f'{indent}{args} = {self.const(z.getargs)}({v})']
+            prefixed = []
+            for i, (prefix, zi) in enumerate(zip(z.prefixes, z.serializers)):
+                ai, ri = self.var('v'), self.var('r')
+                lines.append(f'{indent}{ai} = {args}[{i}]')
+                lines += self.dump(zi, ai, ri, indent)
+                prefixed.append((prefix, ri))
+            if len(prefixed) == 1:
+                (prefix, ri), = prefixed
+                lines.append(f'{indent}{ri} = _protect_unbalanced({ri})')
+                lines.append(f'{indent}{r} = {ri} or "{{}}"' if z.npositional else f'{indent}{r} = {prefix!r} + {ri}')
+            else:
+                lines.append(f'{indent}{r} = ' + (' + "," + '.join(f'{prefix!r} + _protectitem({ri})' for prefix, ri in prefixed) or '""'))
+        return lines
+
+    def dumpfunction(self, z: proto.Serializer[typing.Any]) -> str:
+        try:
+            return self.dumpfunctions[id(z)]
+        except KeyError:
+            pass
+        name = self.dumpfunctions[id(z)] = self.var('_dump')
+        if isinstance(z, _inlined):
+            body = self.dump(z, 'v', 'r', '    ')
+        else: # serializer that is not known to the generator
+            body = [f'    r = {self.const(z)}.dumps(v)']
+        self.functions.append('\n'.join([f'def {name}(v):', *body, '    return r']))
+        return name
+
+
+_inlined = serializer.Sequence, serializer.UniformTuple, serializer.PluriformTuple, serializer.Dict, serializer.Optional, serializer.Union, serializer.Generic
@@ -0,0 +1,132 @@
+'''Incremental deserialization of edited text.'''
+
+import typing
+from . import proto, serializer, util
+
+T = typing.TypeVar('T')
+
+
+class Document(typing.Generic[T]):
+    '''Deserialized value of type `t` that follows edits of its text.
+
+    Every `update` compares the new text to the previous one and determines
+    the unchanged prefix and suffix. Subtrees of the serializer tree whose text
+    lies entirely within those are not deserialized again; their values are
+    taken from the previous parse instead, so that the cost of an update
+    scales with the size of the edit rather than that of the document. Note
+    that tokenization and the text comparison still visit the entire text,
+    albeit at a fraction of the cost of deserialization, and that values of
+    unchanged subtrees are reused rather than copied.
+
+    If `pretty` is true the text is in the format of `util.prettify`, and the
+    comparison is made after `util.deprettify`. A failing update raises the
+    error of the serializer and leaves the document unchanged.'''
+
+    def __init__(self, t: typing.Type[T], text: str, *, pretty: bool = False) -> None:
+        self.pretty = pretty
+        self._memos: typing.List[_Memo[typing.Any]] = []
+        self._serializer = self._wrap(serializer.get(t))
+        self._s = ''
+        self._prefix = 0
+        self._suffix = 0
+        self._shift = 0
+        self._tokens: typing.Optional[util.Tokens] = None
+        self.update(text)
+
+    def _wrap(self, s: proto.Serializer[T]) -> '_Memo[T]':
+        memo = _Memo(self, s, serializer.mapchildren(s, lambda label, z: self._wrap(z)))
+        self._memos.append(memo)
+        return memo
+
+    def update(self, text: str) -> T:
+        'Replace the text of the document and return the new value.'
+
+        s = util.deprettify(text) if self.pretty else text
+        prefix = _commonprefix(self._s, s)
+        suffix = _commonsuffix(self._s, s, min(len(self._s), len(s)) - prefix)
+        self._prefix = prefix
+        self._suffix = len(s) - suffix
+        self._shift = len(s) - len(self._s)
+        for memo in self._memos:
+            memo.current = {}
+        node = util.tokenize(s, keepnodes=True)
+        self._tokens = node.tokens
+        try:
+            value = self._serializer.loadnode(node)
+        except BaseException:
+            for memo in self._memos:
+                memo.current = memo.previous
+            raise
+        for memo in self._memos:
+            memo.previous = memo.current
+        self._s = s
+        self.text = text
+        self.value = value
+        return value
+
+
+class _Memo(typing.Generic[T]):
+
+    def __init__(self, document: Document[typing.Any], original: proto.Serializer[T], serializer: proto.Serializer[T]) -> None:
+        self.document = document
+        self.original = original
+        self.serializer = serializer
+        self.previous: typing.Dict[typing.Tuple[int, int], T] = {}
+        self.current: typing.Dict[typing.Tuple[int, int], T] = {}
+
+    def loads(self, s: str) -> T:
+        # Strings other than the document text, such as docstring defaults, are
+        # loaded by the original serializer to keep them out of the memos.
+        return self.original.loads(s)
+
+    def loadnode(self, node: util.Node) -> T:
+        # Map the span to the previous text if it is not affected by the edit.
+        doc = self.document
+        if node.tokens is not doc._tokens:
+            return self.original.loadnode(node)
+        if node.end <= doc._prefix:
+            key = node.start, node.end
+        elif node.start >= doc._suffix:
+            key = node.start - doc._shift, node.end - doc._shift
+        else:
+            key = None
+        if key in self.previous:
+            v = self.previous[key]
+        else:
+            v = self.serializer.loadnode(node)
+        self.current[node.start, node.end] = v
+        return v
+
+    def dumps(self, v: T) -> str:
+        return self.serializer.dumps(v)
+
+    def __str__(self) -> str:
+        return str(self.serializer)
+
+
+def _commonprefix(a: str, b: str, blocksize: int = 4096) -> int:
+    # Blockwise comparison locates the first difference at C speed without
+    # copying more than a block at a time.
+    n = min(len(a), len(b))
+    i = 0
+    while i < n:
+        j = min(i + blocksize, n)
+        if a[i:j] != b[i:j]:
+            while a[i] == b[i]:
+                i += 1
+            return i
+        i = j
+    return n
+
+
+def _commonsuffix(a: str, b: str, n: int, blocksize: int = 4096) -> int:
+    # Length of the common suffix of `a` and `b`, limited to `n`.
+    i = 0
+    while i < n:
+        j = min(i + blocksize, n)
+        if a[len(a)-j:len(a)-i] != b[len(b)-j:len(b)-i]:
+            while a[len(a)-i-1] == b[len(b)-i-1]:
+                i += 1
+            return i
+        i = j
+    return n
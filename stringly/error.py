@@ -1,3 +1,16 @@
+import typing
+
+
 class StringlyError(Exception): pass
 class SerializationError(StringlyError): pass
 class ImportFunctionError(StringlyError): pass
+
+
+class ItemSerializationError(SerializationError):
+    def __init__(self, index: int, error: SerializationError) -> None:
+        super().__init__(f'item {index}: {error}')
+        self.index = index
+        self.error = error
+
+    def __reduce__(self) -> typing.Tuple[typing.Any, ...]:
+        return type(self), (self.index, self.error)
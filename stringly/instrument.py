@@ -0,0 +1,144 @@
+'''Opt-in profiling of serializer trees.
+
+A `Profiler` wraps every node of a serializer tree in a timing proxy, which
+records the number of calls, the time spent and the size of the serialized
+text per node and operation. Nodes are identified by their type path, formed
+by the name of the root type followed by the labels of `serializer.mapchildren`,
+for example `Solver.mesh.refine` for argument `refine` of argument `mesh`.
+
+While the profiler is active as a context manager it replaces the serializer
+lookup of `stringly.loads`, `dumps`, `load`, `loads_many` and `dumps_many`
+(sequential only) by its own, and restores it on exit, such that unprofiled
+code runs without any instrumentation overhead. Profiling is process wide and
+not thread safe.'''
+
+import sys
+import time
+import typing
+from . import proto, serializer, util
+
+T = typing.TypeVar('T')
+Key = typing.Tuple[str, str]
+
+
+class Record:
+    'Accumulated statistics of a single node and operation.'
+
+    __slots__ = 'ncalls', 'tottime', 'cumtime', 'nbytes', 'caller'
+
+    def __init__(self, caller: typing.Optional[Key]) -> None:
+        self.ncalls = 0
+        self.tottime = 0.
+        self.cumtime = 0.
+        self.nbytes = 0
+        self.caller = caller
+
+    def __repr__(self) -> str:
+        return f'Record(ncalls={self.ncalls}, tottime={self.tottime}, cumtime={self.cumtime}, nbytes={self.nbytes})'
+
+
+class Profiler:
+    '''Collects per node timings of serializer operations.
+
+    The statistics are available as `records`, which maps (path, operation)
+    pairs to `Record` objects, as a formatted table via `table`, and in the
+    format of the standard library's profilers via `create_stats`, such that
+    `pstats.Stats(profiler)` can be used to sort, print or dump them.'''
+
+    def __init__(self) -> None:
+        self.records: typing.Dict[Key, Record] = {}
+        self._wrapped: typing.Dict[typing.Any, proto.Serializer[typing.Any]] = {}
+        self._childtimes: typing.List[float] = []
+        self._saved: typing.List[typing.Any] = []
+
+    def get(self, t: typing.Type[T]) -> proto.Serializer[T]:
+        'Return the profiled serializer for type `t`.'
+
+        s = serializer.get(t)
+        try:
+            return self._wrapped[s]
+        except KeyError:
+            wrapped = self._wrapped[s] = self.wrap(s)
+            return wrapped
+
+    def wrap(self, s: proto.Serializer[T], path: typing.Optional[str] = None, caller: typing.Optional[str] = None) -> proto.Serializer[T]:
+        'Return a profiled copy of serializer tree `s`.'
+
+        if path is None:
+            path = str(s)
+        return _Timed(self, path, caller, serializer.mapchildren(s, lambda label, z: self.wrap(z, path + label, path)))
+
+    def __enter__(self) -> 'Profiler':
+        package = sys.modules[__package__]
+        self._saved.append(package._get)
+        package._get = self.get # type: ignore
+        return self
+
+    def __exit__(self, *exc: typing.Any) -> None:
+        sys.modules[__package__]._get = self._saved.pop() # type: ignore
+
+    def create_stats(self) -> None:
+        self.stats = {(path, 0, op): (r.ncalls, r.ncalls, r.tottime, r.cumtime,
+          {(r.caller[0], 0, r.caller[1]): (r.ncalls, r.ncalls, r.tottime, r.cumtime)} if r.caller else {})
+            for (path, op), r in self.records.items() if r.ncalls}
+
+    def table(self, sort: str = 'cumtime') -> str:
+        'Return the records as a table, sorted by `sort` or by path.'
+
+        items = [(key, r) for key, r in self.records.items() if r.ncalls]
+        if sort == 'path':
+            items.sort()
+        else:
+            items.sort(key=lambda item: getattr(item[1], sort), reverse=True)
+        lines = [f'{"ncalls":>9} {"tottime":>10} {"cumtime":>10} {"bytes":>10}  operation']
+        lines.extend(f'{r.ncalls:9d} {r.tottime:10.6f} {r.cumtime:10.6f} {r.nbytes:10d}  {op} {path}' for (path, op), r in items)
+        return '\n'.join(lines)
+
+    def _record(self, path: str, op: str, caller: typing.Optional[str]) -> Record:
+        try:
+            return self.records[path, op]
+        except KeyError:
+            record = self.records[path, op] = Record((caller, op) if caller is not None else None)
+            return record
+
+
+class _Timed(typing.Generic[T]):
+
+    def __init__(self, profiler: Profiler, path: str, caller: typing.Optional[str], serializer: proto.Serializer[T]) -> None:
+        self.serializer = serializer
+        self.loadrecord = profiler._record(path, 'loads', caller)
+        self.dumprecord = profiler._record(path, 'dumps', caller)
+        self.childtimes = profiler._childtimes
+
+    def loads(self, s: str) -> T:
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> T:
+        self.childtimes.append(0.)
+        t0 = time.perf_counter()
+        try:
+            return self.serializer.loadnode(node)
+        finally:
+            self._add(self.loadrecord, time.perf_counter() - t0, len(node))
+
+    def dumps(self, v: T) -> str:
+        self.childtimes.append(0.)
+        t0 = time.perf_counter()
+        s = ''
+        try:
+            s = self.serializer.dumps(v)
+            return s
+        finally:
+            self._add(self.dumprecord, time.perf_counter() - t0, len(s))
+
+    def _add(self, record: Record, dt: float, nbytes: int) -> None:
+        childtime = self.childtimes.pop()
+        if self.childtimes:
+            self.childtimes[-1] += dt
+        record.ncalls += 1
+        record.tottime += dt - childtime
+        record.cumtime += dt
+        record.nbytes += nbytes
+
+    def __str__(self) -> str:
+        return str(self.serializer)
@@ -1,11 +1,13 @@
 import typing
 import typing_extensions
+from . import util
 
 T = typing.TypeVar('T')
 
 
 class Serializer(typing_extensions.Protocol[T]):
     def loads(self, s: str) -> T: ...
+    def loadnode(self, node: util.Node) -> T: ...
     def dumps(self, v: T) -> str: ...
 
 
@@ -20,5 +22,17 @@ class SupportsRead(typing_extensions.Protocol):
     def read(self) -> str: ...
 
 
+class SupportsReadChunk(typing_extensions.Protocol):
+    def read(self, size: int) -> str: ...
+
+
 class SupportsWrite(typing_extensions.Protocol):
     def write(self, data: str) -> typing.Optional[int]: ...
+
+
+class SupportsAsyncRead(typing_extensions.Protocol):
+    def read(self, size: int) -> typing.Awaitable[typing.Union[str, bytes]]: ...
+
+
+class SupportsAsyncWrite(typing_extensions.Protocol):
+    def write(self, data: typing.Any) -> typing.Any: ...
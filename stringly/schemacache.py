@@ -0,0 +1,98 @@
+'''Optional on-disk cache of Generic serializer schemas.
+
+The schema of a class -- argument names, defaults, number of positional
+arguments and argument types -- combines the signature of the class with the
+defaults that are documented in the `.. arguments::` directive of its
+docstring. If a cache directory is configured, either via `set_directory` or
+the STRINGLY_SCHEMA_CACHE environment variable, the parsed docstring defaults
+are stored as JSON and reused by subsequent processes.
+
+The signature itself is never cached: its defaults must retain their identity,
+and both its defaults and annotations may be defined in other modules than the
+class, so that a cached copy could not be reliably invalidated. Entries are
+keyed by the qualified name of the class and validated against its docstring.
+Classes that are defined inside a function are not cached, as their qualified
+names are not unique. Any failure to read or write the cache is treated as a
+cache miss. The modules needed to read and write entries are imported on first
+use, such that a disabled cache adds nothing to the import time.'''
+
+import os
+import typing
+
+Schema = typing.Dict[str, str]
+
+_version = 2
+_directory: typing.Optional[str] = os.environ.get('STRINGLY_SCHEMA_CACHE') or None
+
+
+def set_directory(path: typing.Optional[typing.Union[str, 'os.PathLike[str]']]) -> None:
+    'Set the cache directory, or disable the cache if `path` is None.'
+
+    global _directory
+    _directory = os.fspath(path) if path is not None else None
+
+
+def get_directory() -> typing.Optional[str]:
+    'Return the cache directory, or None if the cache is disabled.'
+
+    return _directory
+
+
+def _name(cls: typing.Any) -> typing.Optional[str]:
+    # The separator does not occur in module names or qualified names, which
+    # makes the name, and with it the file name, unique.
+    qualname = getattr(cls, '__qualname__', None)
+    if not isinstance(qualname, str) or '<locals>' in qualname:
+        return None
+    return f'{getattr(cls, "__module__", None)}-{qualname}'
+
+
+def load(cls: typing.Any) -> typing.Optional[Schema]:
+    'Return the cached docstring defaults of `cls`, or None if absent or outdated.'
+
+    directory = _directory
+    if directory is None:
+        return None
+    name = _name(cls)
+    if name is None:
+        return None
+    import json
+    try:
+        with open(os.path.join(directory, name + '.json'), encoding='utf-8') as f:
+            entry = json.load(f)
+        if entry['version'] != _version or entry['name'] != name or entry['doc'] != (cls.__doc__ or ''):
+            return None
+        schema = entry['defaults']
+    except Exception:
+        return None
+    if not isinstance(schema, dict) or not all(isinstance(k, str) and isinstance(v, str) for k, v in schema.items()):
+        return None
+    return schema
+
+
+def store(cls: typing.Any, schema: typing.Mapping[str, str]) -> None:
+    'Write the docstring defaults of `cls` to the cache directory, if configured.'
+
+    directory = _directory
+    if directory is None:
+        return
+    name = _name(cls)
+    if name is None:
+        return
+    import json
+    data = json.dumps(dict(version=_version, name=name, doc=cls.__doc__ or '', defaults=dict(schema)))
+    path = os.path.join(directory, name + '.json')
+    # The entry is written to a file that is private to this process and then
+    # moved into place, such that readers never see a partial entry.
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
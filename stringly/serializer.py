@@ -1,14 +1,19 @@
 import collections
 import contextlib
+import copy
 import dataclasses
 import decimal
 import enum
+import functools
 import inspect
 import itertools
+import operator
 import pathlib
+import sys
 import typing
+import weakref
 from typing_extensions import get_origin as typing_get_origin, get_args as typing_get_args
-from . import proto, util, error
+from . import proto, util, error, schemacache
 
 T = typing.TypeVar('T')
 K = typing.TypeVar('K')
@@ -22,21 +27,67 @@ def get(t: typing.Type[T]) -> proto.Serializer[T]:
 def get(t: typing.Any) -> proto.Serializer[typing.Any]:
     ...
 def get(t: typing.Any) -> proto.Serializer[typing.Any]:
+    global _hits, _misses
+    # Typing constructs are interned by the typing module, which makes most
+    # lookups of a type that has been seen before a single identity check.
+    cached = _identities.get(id(t))
+    if cached is not None and cached[0] is t:
+        _hits += 1
+        return cached[1]
+    key = t, tuple(map(id, typing_get_args(t)))
+    try:
+        s = _cache.get(key)
+    except TypeError: # unhashable type
+        return _get(t)
+    if s is None:
+        _misses += 1
+        s = _intern(_create(t))
+        if len(_cache) >= _cachesize:
+            _cache.clear()
+        _cache[key] = s
+    else:
+        _hits += 1
+    if len(_identities) >= _cachesize:
+        _identities.clear()
+    _identities[id(t)] = t, s
+    return s
+
+
+class CacheInfo(typing.NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def cache_clear() -> None:
+    global _hits, _misses
+    _cache.clear()
+    _identities.clear()
+    _hits = _misses = 0
+
+
+def cache_info() -> CacheInfo:
+    return CacheInfo(_hits, _misses, _cachesize, len(_cache))
+
+
+def _get(t: typing.Any) -> proto.Serializer[typing.Any]:
+    return _intern(_create(t))
+
+
+def _create(t: typing.Any) -> proto.Serializer[typing.Any]:
     if hasattr(t, '__stringly_loads__') and hasattr(t, '__stringly_dumps__'):
         return Custom(t)
+    # NumPy is an optional dependency that is never imported here: a type that
+    # refers to it implies that it has been imported already.
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and (t is numpy.ndarray or typing_get_origin(t) is numpy.ndarray):
+        return NDArray(_ndarraydtype(t))
     if isinstance(t, type):
-        if t is bool:
-            return Boolean()
-        if t is int:
-            return Native(t, alt=(bool,))
-        if t is float:
-            return Native(t, alt=(int, bool), trim=(('', '.0'),))
-        if t is complex:
-            return Native(t, alt=(float, int, bool), trim=(('(', ')'), ('', '+0j')))
-        if t in (str, decimal.Decimal, pathlib.Path):
-            return Native(t)
+        if t in (bool, int, float, complex, str, decimal.Decimal, pathlib.Path):
+            return _scalars[t]
         if issubclass(t, enum.Enum):
-            return Enum(t)
+            return Enum(t, aliases=bool(getattr(t, '__stringly_aliases__', False)))
         if t is tuple:
             raise ValueError('cannot serialize tuple; use typing.Tuple[] instead')
         if t is list:
@@ -78,18 +129,100 @@ def get(t: typing.Any) -> proto.Serializer[typing.Any]:
     raise ValueError(f'unsupported type: {t}')
 
 
-def _assert_isinstance(v, *types):
+# Serializers are immutable after construction, which means that a single
+# instance can be shared between all types that contain `t`. Since `_create`
+# resolves nested types via `get`, sub-serializers are cached as well. Both
+# tables are bounded by `_cachesize` and emptied when full.
+#
+# Equality of typing constructs is not always sensitive to the order of
+# arguments (`typing.Union[int,str] == typing.Union[str,int]`) while the
+# resulting serializers are, so the cache key includes the identities of the
+# arguments, which are kept alive by `t`. The identity table in front of the
+# cache references the types it holds for the same reason.
+_cachesize = 1024
+_cache: typing.Dict[typing.Tuple[typing.Any, typing.Tuple[int, ...]], proto.Serializer[typing.Any]] = {}
+_identities: typing.Dict[int, typing.Tuple[typing.Any, proto.Serializer[typing.Any]]] = {}
+_hits = 0
+_misses = 0
+
+
+def _intern(s: proto.Serializer[T]) -> proto.Serializer[T]:
+    # Different types can result in structurally identical serializers, e.g.
+    # `typing.List[int]` and `list[int]`, or types that dropped out of the cache
+    # of `get`. Those are replaced by a single live instance. Since children are
+    # interned before their parents, structural identity reduces to identity of
+    # the direct attributes.
+    structure = getattr(s, '_structure', None)
+    if structure is None:
+        return s
+    try:
+        return _interned.setdefault(structure(), s)
+    except TypeError: # unhashable type
+        return s
+
+_interned: 'weakref.WeakValueDictionary[typing.Hashable, proto.Serializer[typing.Any]]' = weakref.WeakValueDictionary()
+
+
+def mapchildren(s: proto.Serializer[T], f: typing.Callable[[str, proto.Serializer[typing.Any]], proto.Serializer[typing.Any]]) -> proto.Serializer[T]:
+    '''Return a copy of `s` with every sub-serializer `z` replaced by `f(label, z)`.
+
+    The label is the suffix that extends the type path of `s` to that of `z`:
+    `.name` for argument `name` of a Generic or member `name` of a Union,
+    `[]` for the items of a sequence and the values of a dict, `[i]` for item
+    `i` of a pluriform tuple, `.key` for the keys of a dict and `?` for the
+    value of an optional. Serializers without sub-serializers are returned as
+    is. The original serializer is left untouched.'''
+
+    r: typing.Any = copy.copy(s)
+    if isinstance(s, (UniformTuple, Sequence)):
+        r.itemserializer = f('[]', s.itemserializer)
+    elif isinstance(s, PluriformTuple):
+        r.itemserializers = tuple(f(f'[{i}]', z) for i, z in enumerate(s.itemserializers))
+    elif isinstance(s, Dict):
+        r.keyserializer = f('.key', s.keyserializer)
+        r.valueserializer = f('[]', s.valueserializer)
+    elif isinstance(s, Optional):
+        r.serializer = f('?', s.serializer)
+    elif isinstance(s, Union):
+        # The dump types follow from the original members, which retains the
+        # dispatch if `f` returns serializers of a different class.
+        r.serializers = collections.OrderedDict((name, f('.' + name, z)) for name, z in s.serializers.items())
+        r.dumptypes = tuple((name, r.serializers[name], types) for name, z, types in s.dumptypes)
+        r.dispatch = {}
+    elif isinstance(s, Generic):
+        r.serializers = tuple(f('.' + name, z) for name, z in zip(s.argnames, s.serializers))
+        # Parsed docstring defaults are stored in place, which must not reach
+        # the original.
+        r.defaults = list(s.defaults)
+    else:
+        return s
+    return typing.cast(proto.Serializer[T], r)
+
+
+_protectitem = util.protector(',')
+_protectkey = util.protector(',|=')
+
+
+def _assert_isinstance(v: typing.Any, *types: type) -> None:
     if not isinstance(v, types):
         raise error.SerializationError(f'{v} <{type(v).__qualname__}> is not an instance of {" or ".join(T.__qualname__ for T in types)}')
 
 
 class Custom(typing.Generic[T]):
+    __slots__ = 'C', '__weakref__'
+
     def __init__(self, C: proto.Custom[T]) -> None:
         self.C = C
 
+    def _structure(self) -> typing.Hashable:
+        return Custom, self.C
+
     def loads(self, s: str) -> T:
         return self.C.__stringly_loads__(s)
 
+    def loadnode(self, node: util.Node) -> T:
+        return self.C.__stringly_loads__(str(node))
+
     def dumps(self, v: T) -> str:
          return self.C.__stringly_dumps__(v)
 
@@ -97,13 +230,28 @@ class Custom(typing.Generic[T]):
         return str(getattr(self.C, '__name__', self.C))
 
 
+# Boolean words in their common spellings, such that only mixed case words
+# require a conversion to lower case. The table is shared and must not be
+# modified; it is a plain dict rather than a read-only proxy as the latter
+# doubles the cost of a lookup.
+_booleans = {spelling: v for word, v in [('true', True), ('yes', True), ('false', False), ('no', False)]
+  for spelling in (word, word.capitalize(), word.upper())}
+
+
 class Boolean:
+    __slots__ = '__weakref__',
+
     def loads(self, s: str) -> bool:
-        v = dict(true=True, yes=True, false=False, no=False).get(s.lower())
+        v = _booleans.get(s)
         if v is None:
-            raise error.SerializationError(f'invalid boolean value {s!r}')
+            v = _booleans.get(s.lower())
+            if v is None:
+                raise error.SerializationError(f'invalid boolean value {s!r}')
         return v
 
+    def loadnode(self, node: util.Node) -> bool:
+        return self.loads(str(node))
+
     def dumps(self, v: bool) -> str:
         _assert_isinstance(v, bool)
         return bool.__str__(v)
@@ -113,19 +261,24 @@ class Boolean:
 
 
 class Native:
-    def __init__(self, T, alt=(), trim=()):
+    __slots__ = 'T', 'alt', 'trim', '__weakref__'
+
+    def __init__(self, T: typing.Any, alt: typing.Tuple[type, ...] = (), trim: typing.Tuple[typing.Tuple[str, str], ...] = ()) -> None:
         self.T = T
         self.alt = alt
         self.trim = trim
 
-    def loads(self, s: str) -> int:
+    def loads(self, s: str) -> typing.Any:
         try:
             v = self.T(s)
         except Exception as e:
             raise error.SerializationError(e)
         return v
 
-    def dumps(self, v):
+    def loadnode(self, node: util.Node) -> typing.Any:
+        return self.loads(str(node))
+
+    def dumps(self, v: typing.Any) -> str:
         _assert_isinstance(v, self.T, *self.alt)
         s = str(self.T(v))
         for prefix, suffix in self.trim:
@@ -133,38 +286,178 @@ class Native:
                 s = s[len(prefix):len(s)-len(suffix)]
         return s
 
-    def __str__(self):
-        return self.T.__qualname__
+    def __str__(self) -> str:
+        return str(self.T.__qualname__)
+
+
+class _Number(Native):
+    # Numbers never require protection, which allows containers to load and
+    # dump their items in bulk via `loaditems` and `dumpitems`. The `T`, `alt`
+    # and `trim` attributes are retained for introspection; the output is
+    # identical to that of `Native`.
+
+    __slots__ = ()
+
+    def loaditems(self, node: util.Node) -> typing.List[typing.Any]:
+        'Load the comma separated items of `node`.'
+
+        s = str(node)
+        if '{' not in s:
+            try:
+                return list(map(self.T, s.split(','))) if s else []
+            except ValueError:
+                pass # the item-wise load below raises the proper error
+        return [self.loadnode(item.unprotect()) for item in node.split(',')]
+
+    def dumpitems(self, values: typing.Iterable[typing.Any]) -> str:
+        'Dump `values` separated by commas.'
+
+        return ','.join(map(self.dumps, values))
+
+
+class Int(_Number):
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        super().__init__(int, alt=(bool,))
+
+    def dumps(self, v: int) -> str:
+        if type(v) is not int:
+            _assert_isinstance(v, int, bool)
+            v = int(v)
+        return int.__repr__(v)
+
+    def dumpitems(self, values: typing.Iterable[int]) -> str:
+        # `int.__repr__` accepts int subclasses, such as bool, and formats them
+        # as `str(int(v))`. Other types fall back to the item-wise checks, for
+        # which one-shot iterables are materialized beforehand.
+        if not isinstance(values, (list, tuple)):
+            values = list(values)
+        try:
+            return ','.join(map(int.__repr__, values))
+        except TypeError:
+            return ','.join(map(self.dumps, values))
+
+
+class Float(_Number):
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        super().__init__(float, alt=(int, bool), trim=(('', '.0'),))
+
+    def dumps(self, v: float) -> str:
+        if type(v) is not float:
+            _assert_isinstance(v, float, int, bool)
+            v = float(v)
+        s = float.__repr__(v)
+        return s[:-2] if s.endswith('.0') else s
+
+    def dumpitems(self, values: typing.Iterable[float]) -> str:
+        if not isinstance(values, (list, tuple)):
+            values = list(values)
+        try:
+            return _trimfloats(','.join(map(float.__repr__, values)))
+        except TypeError:
+            return ','.join(map(self.dumps, values))
+
+
+class Complex(_Number):
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        super().__init__(complex, alt=(float, int, bool), trim=(('(', ')'), ('', '+0j')))
+
+    def dumps(self, v: complex) -> str:
+        if type(v) is not complex:
+            _assert_isinstance(v, complex, float, int, bool)
+            v = complex(v)
+        s = complex.__repr__(v)
+        if s.startswith('('):
+            s = s[1:-1]
+        return s[:-3] if s.endswith('+0j') else s
+
+
+def _trimfloats(s: str) -> str:
+    # Remove the suffix '.0' from every item of a comma separated list of float
+    # representations. The fractional part of a float repr ends with a zero
+    # only if it is zero, hence '.0,' marks the end of such an item.
+    return (s + ',').replace('.0,', ',')[:-1]
+
+
+# Serializers of scalar types are stateless and therefore shared.
+_scalars: typing.Dict[type, proto.Serializer[typing.Any]] = {
+    bool: Boolean(),
+    int: Int(),
+    float: Float(),
+    complex: Complex(),
+    str: Native(str),
+    decimal.Decimal: Native(decimal.Decimal),
+    pathlib.Path: Native(pathlib.Path),
+}
 
 
 class UniformTuple(typing.Generic[T]):
+    __slots__ = 'itemserializer', '__weakref__'
+
     def __init__(self, itemserializer: proto.Serializer[T]) -> None:
         self.itemserializer = itemserializer
 
+    def _structure(self) -> typing.Hashable:
+        return UniformTuple, self.itemserializer
+
     def loads(self, s: str) -> typing.Tuple[T,...]:
-        parts = util.safesplit(s, ',')
-        return tuple(self.itemserializer.loads(util.unprotect(si)) for si in parts)
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> typing.Tuple[T,...]:
+        if isinstance(self.itemserializer, _Number):
+            return tuple(self.itemserializer.loaditems(node))
+        if node.isflat():
+            s = str(node)
+            return tuple(map(self.itemserializer.loads, s.split(','))) if s else ()
+        return tuple(map(self.loaditem, node.split(',')))
+
+    def loaditem(self, node: util.Node) -> T:
+        return self.itemserializer.loadnode(node.unprotect())
 
     def dumps(self, v: typing.Tuple[T, ...]) -> str:
-        return ','.join(util.protect_regex(self.itemserializer.dumps(vi), ',') or '{}' for vi in v)
+        if isinstance(self.itemserializer, _Number):
+            return self.itemserializer.dumpitems(v)
+        return ','.join(map(self.dumpitem, v))
+
+    def dumpitem(self, v: T) -> str:
+        return _protectitem(self.itemserializer.dumps(v)) or '{}'
 
     def __str__(self) -> str:
         return f'typing.Tuple[{self.itemserializer}, ...]'
 
 
 class PluriformTuple:
+    __slots__ = 'itemserializers', '__weakref__'
+
     def __init__(self, itemserializers: typing.Tuple[proto.Serializer[typing.Any], ...]) -> None:
         self.itemserializers = itemserializers
 
+    def _structure(self) -> typing.Hashable:
+        return PluriformTuple, self.itemserializers
+
     def loads(self, s: str) -> typing.Tuple[typing.Any, ...]:
-        parts = util.safesplit(s, ',')
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> typing.Tuple[typing.Any, ...]:
+        if node.isflat():
+            s = str(node)
+            strings = s.split(',') if s else []
+            if len(self.itemserializers) == len(strings):
+                return tuple(zi.loads(si) for zi, si in zip(self.itemserializers, strings))
+            raise error.SerializationError('tuple has incorrect length')
+        parts = node.split(',')
         if len(self.itemserializers) == len(parts):
-            return tuple(zi.loads(util.unprotect(si)) for zi, si in zip(self.itemserializers, parts))
+            return tuple(zi.loadnode(si.unprotect()) for zi, si in zip(self.itemserializers, parts))
         raise error.SerializationError('tuple has incorrect length')
 
     def dumps(self, v: typing.Tuple[typing.Any, ...]) -> str:
         if len(self.itemserializers) == len(v):
-            return ','.join(util.protect_regex(zi.dumps(vi), ',') or '{}' for zi, vi in zip(self.itemserializers, v))
+            return ','.join(_protectitem(zi.dumps(vi)) or '{}' for zi, vi in zip(self.itemserializers, v))
         raise error.SerializationError('tuple has incorrect length')
 
     def __str__(self) -> str:
@@ -172,39 +465,78 @@ class PluriformTuple:
 
 
 class Dict(typing.Generic[K, V]):
+    __slots__ = 'keyserializer', 'valueserializer', '__weakref__'
+
     def __init__(self, keyserializer: proto.Serializer[K], valueserializer: proto.Serializer[V]) -> None:
         self.keyserializer = keyserializer
         self.valueserializer = valueserializer
 
+    def _structure(self) -> typing.Hashable:
+        return Dict, self.keyserializer, self.valueserializer
+
     def loads(self, s: str) -> typing.Dict[K, V]:
-        v: typing.Dict[K, V] = {}
-        for si in util.safesplit(s, ','):
-            parts = util.safesplit(si, '=', 1)
-            if len(parts) != 2:
-                raise error.SerializationError('missing value')
-            key, value = map(util.unprotect, parts)
-            v[self.keyserializer.loads(key)] = self.valueserializer.loads(value)
-        return v
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> typing.Dict[K, V]:
+        if node.isflat():
+            s = str(node)
+            return dict(map(self._loadflatitem, s.split(','))) if s else {}
+        return dict(map(self.loaditem, node.split(',')))
+
+    def _loadflatitem(self, s: str) -> typing.Tuple[K, V]:
+        key, sep, value = s.partition('=')
+        if not sep:
+            raise error.SerializationError('missing value')
+        return self.keyserializer.loads(key), self.valueserializer.loads(value)
+
+    def loaditem(self, node: util.Node) -> typing.Tuple[K, V]:
+        if node.isflat():
+            return self._loadflatitem(str(node))
+        parts = node.split('=', 1)
+        if len(parts) != 2:
+            raise error.SerializationError('missing value')
+        key, value = parts
+        return self.keyserializer.loadnode(key.unprotect()), self.valueserializer.loadnode(value.unprotect())
 
     def dumps(self, v: typing.Dict[K, V]) -> str:
-        return ','.join(util.protect_regex(self.keyserializer.dumps(vk), ',|=') + '=' + util.protect_regex(self.valueserializer.dumps(vv), ',') for vk, vv in v.items())
+        return ','.join(map(self.dumpitem, v.items()))
+
+    def dumpitem(self, item: typing.Tuple[K, V]) -> str:
+        vk, vv = item
+        return _protectkey(self.keyserializer.dumps(vk)) + '=' + _protectitem(self.valueserializer.dumps(vv))
 
     def __str__(self) -> str:
         return f'typing.Dict[{self.keyserializer}, {self.valueserializer}]'
 
 
 class Union:
+    __slots__ = 'serializers', 'dumptypes', 'dispatch', '__weakref__'
+
     def __init__(self, serializers: typing.Mapping[str, proto.Serializer[typing.Any]]) -> None:
         self.serializers = serializers
+        self.dumptypes = tuple((name, serializer, _dumptypes(serializer)) for name, serializer in serializers.items())
+        self.dispatch: typing.Dict[type, typing.Tuple[typing.Tuple[str, proto.Serializer[typing.Any]], ...]] = {}
+
+    def _structure(self) -> typing.Hashable:
+        return Union, tuple(self.serializers.items())
 
     def loads(self, s: str) -> typing.Any:
-        name, value = util.splitarg(s)
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> typing.Any:
+        name, value = node.splitarg()
         if name not in self.serializers:
             raise error.SerializationError(f'unknown type: {name}')
-        return self.serializers[name].loads(value)
+        return self.serializers[name].loadnode(value)
 
     def dumps(self, v: typing.Any) -> str:
-        for name, serializer in self.serializers.items():
+        # Only members that can dump instances of `type(v)` are tried, in order,
+        # which gives the same result as trying all members.
+        try:
+            candidates = self.dispatch[type(v)]
+        except KeyError:
+            candidates = self.dispatch[type(v)] = tuple((name, serializer) for name, serializer, types in self.dumptypes if types is None or issubclass(type(v), types))
+        for name, serializer in candidates:
             try:
                 s = serializer.dumps(v)
             except error.SerializationError:
@@ -216,14 +548,38 @@ class Union:
         return f'typing.Union[{", ".join(map(str, self.serializers.values()))}]'
 
 
+def _dumptypes(serializer: proto.Serializer[typing.Any]) -> typing.Optional[typing.Tuple[type, ...]]:
+    # Types outside of which `serializer.dumps` is known to fail, or None if
+    # the serializer may accept any type.
+    if isinstance(serializer, Boolean):
+        return bool,
+    if isinstance(serializer, Native):
+        return (serializer.T, *serializer.alt)
+    if isinstance(serializer, Enum):
+        return serializer.cls,
+    if isinstance(serializer, Generic) and isinstance(serializer.cls, type):
+        return serializer.cls,
+    if isinstance(serializer, NDArray):
+        return sys.modules['numpy'].ndarray,
+    return None
+
+
 class Optional(typing.Generic[T]):
+    __slots__ = 'serializer', '__weakref__'
+
     def __init__(self, serializer: proto.Serializer[T]) -> None:
         self.serializer = serializer
 
+    def _structure(self) -> typing.Hashable:
+        return Optional, self.serializer
+
     def loads(self, s: str) -> typing.Optional[T]:
-        if s == '':
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> typing.Optional[T]:
+        if not node:
             return None
-        return self.serializer.loads(util.unprotect(s))
+        return self.serializer.loadnode(node.unprotect())
 
     def dumps(self, v: typing.Optional[T]) -> str:
         if v is None:
@@ -236,29 +592,147 @@ class Optional(typing.Generic[T]):
 
 
 class Sequence:
+    __slots__ = 'itemserializer', 'origin', '__weakref__'
+
     def __init__(self, itemserializer: proto.Serializer[typing.Any], origin: typing.Any) -> None:
         self.itemserializer = itemserializer
         self.origin = origin
 
+    def _structure(self) -> typing.Hashable:
+        return Sequence, self.itemserializer, self.origin
+
     def loads(self, s: str) -> typing.Any:
-        return self.origin(self.itemserializer.loads(util.unprotect(si)) for si in util.safesplit(s, ','))
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> typing.Any:
+        if isinstance(self.itemserializer, _Number):
+            return self.origin(self.itemserializer.loaditems(node))
+        if node.isflat():
+            s = str(node)
+            return self.origin(map(self.itemserializer.loads, s.split(',')) if s else ())
+        return self.origin(map(self.loaditem, node.split(',')))
+
+    def loaditem(self, node: util.Node) -> typing.Any:
+        return self.itemserializer.loadnode(node.unprotect())
 
     def dumps(self, v: typing.Any) -> str:
-        return ','.join(util.protect_regex(self.itemserializer.dumps(vi), ',') or '{}' for vi in v)
+        if isinstance(self.itemserializer, _Number):
+            return self.itemserializer.dumpitems(v)
+        return ','.join(map(self.dumpitem, v))
+
+    def dumpitem(self, v: typing.Any) -> str:
+        return _protectitem(self.itemserializer.dumps(v)) or '{}'
 
     def __str__(self) -> str:
         typename = {list: 'typing.List', set: 'typing.Set', frozenset: 'typing.FrozenSet'}[self.origin]
         return f'{typename}[{self.itemserializer}]'
 
+def _ndarraydtype(t: typing.Any) -> typing.Any:
+    # The dtype of `numpy.ndarray`, which defaults to float64, or of
+    # `numpy.typing.NDArray[scalar]`, which is `ndarray[shape, dtype[scalar]]`.
+    import numpy
+    if t is numpy.ndarray:
+        return numpy.dtype(numpy.float64)
+    args = typing_get_args(t)
+    scalars = typing_get_args(args[1]) if len(args) == 2 else ()
+    if len(scalars) != 1 or not isinstance(scalars[0], type) or not issubclass(scalars[0], numpy.generic):
+        raise ValueError(f'unsupported type: {t}')
+    dtype = numpy.dtype(scalars[0])
+    if dtype.kind not in 'iuf':
+        raise ValueError(f'unsupported type: {t}')
+    return dtype
+
+
+class NDArray:
+    '''One dimensional integer or floating point NumPy array.
+
+    The serialized form is that of `typing.Tuple[int, ...]` or
+    `typing.Tuple[float, ...]`, but the items are parsed and formatted in bulk
+    rather than by a serializer per item. Items are formatted via the Python
+    scalars, such that float64 values round-trip exactly.'''
+
+    __slots__ = 'dtype', '__weakref__'
+
+    def __init__(self, dtype: typing.Any) -> None:
+        self.dtype = dtype
+
+    def _structure(self) -> typing.Hashable:
+        return NDArray, self.dtype
+
+    def loads(self, s: str) -> typing.Any:
+        if '{' in s or '}' in s:
+            return self.loadnode(util.tokenize(s))
+        # Without braces there is nothing to tokenize.
+        return self._fromstrings(s.split(',') if s else [])
+
+    def loadnode(self, node: util.Node) -> typing.Any:
+        s = str(node)
+        # Numbers never need protection, but protected items are accepted for
+        # compatibility with the tuple form.
+        return self._fromstrings([str(item.unprotect()) for item in node.split(',')] if '{' in s else s.split(',') if s else [])
+
+    def _fromstrings(self, items: typing.List[str]) -> typing.Any:
+        import numpy
+        try:
+            return numpy.array(items, dtype=self.dtype)
+        except Exception as e:
+            raise error.SerializationError(e)
+
+    def dumps(self, v: typing.Any) -> str:
+        import numpy
+        _assert_isinstance(v, numpy.ndarray)
+        if v.ndim != 1:
+            raise error.SerializationError(f'expected a one dimensional array, got {v.ndim} dimensions')
+        if not numpy.can_cast(v.dtype, self.dtype, 'same_kind'):
+            raise error.SerializationError(f'cannot dump array of type {v.dtype} as {self.dtype}')
+        s = ','.join(map(str, v.astype(self.dtype, copy=False).tolist()))
+        return _trimfloats(s) if self.dtype.kind == 'f' else s
+
+    def __str__(self) -> str:
+        return f'numpy.typing.NDArray[numpy.{self.dtype.type.__name__}]'
+
+
 enumT = typing.TypeVar('enumT', bound=enum.Enum)
 
 
 class Enum(typing.Generic[enumT]):
-    def __init__(self, cls: typing.Type[enumT]) -> None:
+    '''Enum serializer that loads members by name.
+
+    If `aliases` is true, members are additionally loaded by the string form of
+    their value and by their case folded name, in that order of precedence
+    after the exact name. Aliases are enabled for enum classes that define
+    `__stringly_aliases__ = True`. Members are always dumped by name.'''
+
+    __slots__ = 'cls', 'aliases', 'lookup', '__weakref__'
+
+    def __init__(self, cls: typing.Type[enumT], *, aliases: bool = False) -> None:
         self.cls = cls
+        self.aliases = aliases
+        # Exact names take precedence over values, and values over case folded
+        # names; within each kind the first member wins.
+        lookup: typing.Dict[str, enumT] = {}
+        if aliases:
+            for member in cls.__members__.values():
+                lookup.setdefault(str(member.value), member)
+            for name, member in cls.__members__.items():
+                lookup.setdefault(name.casefold(), member)
+        lookup.update(cls.__members__)
+        self.lookup = lookup
+
+    def _structure(self) -> typing.Hashable:
+        return Enum, self.cls, self.aliases
 
     def loads(self, s: str) -> enumT:
-        return self.cls.__members__[s]
+        v = self.lookup.get(s)
+        if v is None:
+            if self.aliases:
+                v = self.lookup.get(s.casefold())
+            if v is None:
+                raise error.SerializationError(f'invalid {self} value {s!r}')
+        return v
+
+    def loadnode(self, node: util.Node) -> enumT:
+        return self.loads(str(node))
 
     def dumps(self, v: enumT) -> str:
         _assert_isinstance(v, self.cls)
@@ -268,89 +742,175 @@ class Enum(typing.Generic[enumT]):
         return str(getattr(self.cls, '__name__', ''))
 
 
+_immutabletypes = type(None), bool, int, float, complex, str, bytes, decimal.Decimal, pathlib.PurePath, enum.Enum
+
+
+def _isimmutable(v: typing.Any) -> bool:
+    if isinstance(v, (tuple, frozenset)):
+        return all(map(_isimmutable, v))
+    return isinstance(v, _immutabletypes)
+
+
 class _strarg:
     def __init__(self, value: str) -> None:
         self.value = value
 
 
+def _argsgetter(cls: typing.Any, argnames: typing.Tuple[str, ...]) -> typing.Callable[[typing.Any], typing.Tuple[typing.Any, ...]]:
+    if hasattr(cls, '__getnewargs_ex__'):
+        def getargs(v: typing.Any) -> typing.Tuple[typing.Any, ...]:
+            args: typing.Tuple[typing.Any, ...]
+            kwargs: typing.Dict[str, typing.Any]
+            args, kwargs = cls.__getnewargs_ex__(v)
+            assert len(args) + len(kwargs) == len(argnames)
+            return args + tuple(kwargs[name] for name in argnames[len(args):])
+    elif hasattr(cls, '__getnewargs__'):
+        def getargs(v: typing.Any) -> typing.Tuple[typing.Any, ...]:
+            args: typing.Tuple[typing.Any, ...] = cls.__getnewargs__(v)
+            assert len(args) == len(argnames)
+            return args
+    elif dataclasses.is_dataclass(cls) and len(argnames) > 1:
+        return typing.cast(typing.Callable[[typing.Any], typing.Tuple[typing.Any, ...]], operator.attrgetter(*argnames))
+    elif dataclasses.is_dataclass(cls):
+        def getargs(v: typing.Any) -> typing.Tuple[typing.Any, ...]:
+            return tuple(getattr(v, name) for name in argnames)
+    else:
+        def getargs(v: typing.Any) -> typing.Tuple[typing.Any, ...]:
+            raise error.SerializationError(f'cannot dump {v}')
+    return getargs
+
+
+@functools.lru_cache(maxsize=1024)
+def _layout(argnames: typing.Tuple[str, ...], npositional: int) -> typing.Tuple[typing.Mapping[str, int], typing.Tuple[str, ...]]:
+    # The keyword index and the protected key prefixes depend only on the
+    # argument names, and are shared between classes with the same signature.
+    argindex = {name: i for i, name in enumerate(argnames) if i >= npositional}
+    if len(argnames) == 1:
+        prefixes: typing.Tuple[str, ...] = ('' if npositional else util.protect_regex(argnames[0], '=') + '=',)
+    else:
+        prefixes = tuple('' if i < npositional else util.protect_regex(name, ',|=') + '=' for i, name in enumerate(argnames))
+    return argindex, prefixes
+
+
+def _schema(cls: typing.Any, docdefaults: typing.Mapping[str, str]) -> typing.Tuple[typing.Tuple[str, ...], typing.Tuple[typing.Any, ...], int, typing.Tuple[typing.Any, ...]]:
+    params = inspect.signature(cls).parameters
+    argnames = tuple(params)
+    npositional = 0
+    types: typing.List[typing.Any] = []
+    for param in params.values():
+        if param.kind is param.POSITIONAL_ONLY:
+            if npositional < len(types):
+                raise Exception('invalid function signature: keyword argument followed by positional argument')
+            npositional += 1
+        elif param.kind not in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY):
+            raise Exception('invalid function signature: variable arguments are not supported')
+        if param.annotation is not param.empty:
+            types.append(param.annotation)
+        elif param.default is not param.empty:
+            types.append(type(param.default))
+        else:
+            raise Exception(f'invalid function signature: type cannot be inferred for argument {param.name!r}')
+    return argnames, tuple(_strarg(docdefaults[name]) if name in docdefaults else params[name].default for name in argnames), npositional, tuple(types)
+
+
 class Generic(typing.Generic[T]):
+    __slots__ = 'cls', 'argnames', 'defaults', 'npositional', 'serializers', 'argindex', 'getargs', 'prefixes', '__weakref__'
+
     def __init__(self, cls: typing.Type[T]) -> None:
         self.cls = cls
-        params = inspect.signature(cls).parameters
-        defaults = util.DocString(cls).defaults
-        self.argnames = tuple(params)
-        self.defaults = [_strarg(defaults[name]) if name in defaults else params[name].default for name in self.argnames]
-        self.npositional = 0
-        self.serializers: typing.List[proto.Serializer[T]] = []
-        for param in params.values():
-            if param.kind is param.POSITIONAL_ONLY:
-                if self.npositional < len(self.serializers):
-                    raise Exception('invalid function signature: keyword argument followed by positional argument')
-                self.npositional += 1
-            elif param.kind not in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY):
-                raise Exception('invalid function signature: variable arguments are not supported')
-            if param.annotation is not param.empty:
-                T = param.annotation
-            elif param.default is not param.empty:
-                T = type(param.default)
-            else:
-                raise Exception(f'invalid function signature: type cannot be inferred for argument {param.name!r}')
-            self.serializers.append(get(T))
+        docdefaults = schemacache.load(cls)
+        if docdefaults is None:
+            docdefaults = dict(util.DocString(cls).defaults)
+            schemacache.store(cls, docdefaults)
+        self.argnames, defaults, self.npositional, types = _schema(cls, docdefaults)
+        self.defaults = list(defaults)
+        self.serializers: typing.Tuple[proto.Serializer[T], ...] = tuple(get(T) for T in types)
+        # Compile the dump plan: the argument extractor and the protected key
+        # prefixes depend only on the class and are therefore resolved once.
+        self.getargs = _argsgetter(cls, self.argnames)
+        self.argindex, self.prefixes = _layout(self.argnames, self.npositional)
 
     def loads(self, s: str) -> T:
-        args = self.defaults.copy()
-        if not s:
+        return self.loadnode(util.tokenize(s))
+
+    def loadnode(self, node: util.Node) -> T:
+        # Arguments without braces are split and loaded as strings, others as
+        # nodes; given arguments are loaded in argument order.
+        given: typing.Dict[int, typing.Union[util.Node, str]] = {}
+        if not node:
             pass
         elif len(self.argnames) == 1:
-            if not self.npositional:
-                parts = util.safesplit(s, '=', 1)
-                if len(parts) != 2 or parts[0] != self.argnames[0]:
-                    raise error.SerializationError(f'invalid argument {parts[0]!r}') from None
-                s = parts[1]
-            args[0] = _strarg(util.unprotect(s))
+            if self.npositional:
+                given[0] = str(node) if node.isflat() else node.unprotect()
+            elif node.isflat():
+                name, sep, value = str(node).partition('=')
+                if not sep or name != self.argnames[0]:
+                    raise error.SerializationError(f'invalid argument {name!r}')
+                given[0] = value
+            else:
+                parts = node.split('=', 1)
+                if len(parts) != 2 or str(parts[0]) != self.argnames[0]:
+                    raise error.SerializationError(f'invalid argument {str(parts[0])!r}') from None
+                given[0] = parts[1].unprotect()
         else:
+            s = str(node) if node.isflat() else None
             index = 0
-            for si in util.safesplit(s, ','):
-                parts = util.safesplit(si, '=', 1)
-                if len(parts) == 2:
-                    name, value = map(util.unprotect, parts)
-                    try:
-                        index = self.argnames.index(name, self.npositional)
-                    except ValueError:
-                        raise error.SerializationError(f'invalid argument {name!r}') from None
-                    args[index] = _strarg(value)
+            for key, item in map(self._flatitem, s.split(',')) if s is not None else map(self._item, node.split(',')):
+                if key is not None:
+                    index = self.argindex.get(key, -1)
+                    if index < 0:
+                        raise error.SerializationError(f'invalid argument {key!r}')
+                    if index in given:
+                        raise error.SerializationError(f'duplicate argument {key!r}')
+                    given[index] = item
                 elif index < self.npositional:
-                    args[index] = _strarg(util.unprotect(si))
+                    given[index] = item
                     index += 1
                 else:
                     raise error.SerializationError('invalid expression')
+        args = self.defaults.copy()
         for i, arg in enumerate(args):
-            if arg is inspect.Parameter.empty:
+            if i in given:
+                v = given[i]
+                args[i] = self.serializers[i].loads(v) if isinstance(v, str) else self.serializers[i].loadnode(v)
+            elif arg is inspect.Parameter.empty:
                 raise error.SerializationError(f'missing mantatory argument {self.argnames[i]!r}')
-            if isinstance(arg, _strarg):
-                args[i] = self.serializers[i].loads(arg.value)
+            elif isinstance(arg, _strarg):
+                args[i] = self._loaddefault(i, arg)
         return self.cls(*args[:self.npositional], **dict(zip(self.argnames[self.npositional:], args[self.npositional:])))
 
+    def _item(self, node: util.Node) -> typing.Tuple[typing.Optional[str], typing.Union[util.Node, str]]:
+        # The argument name, or None if positional, and the unprotected value.
+        if node.isflat():
+            return self._flatitem(str(node))
+        parts = node.split('=', 1)
+        if len(parts) == 2:
+            return str(parts[0].unprotect()), parts[1].unprotect()
+        return None, node.unprotect()
+
+    @staticmethod
+    def _flatitem(s: str) -> typing.Tuple[typing.Optional[str], typing.Union[util.Node, str]]:
+        name, sep, value = s.partition('=')
+        return (name, value) if sep else (None, s)
+
+    def _loaddefault(self, i: int, arg: _strarg) -> typing.Any:
+        # Docstring defaults are parsed on first use rather than at construction,
+        # such that invalid defaults only fail if they are needed. Immutable
+        # values replace the string default; mutable values are parsed anew for
+        # every object to avoid sharing state between instances.
+        v = self.serializers[i].loads(arg.value)
+        if _isimmutable(v):
+            self.defaults[i] = v
+        return v
+
     def dumps(self, v: T) -> str:
         _assert_isinstance(v, self.cls)
-        if hasattr(self.cls, '__getnewargs_ex__'):
-            args, kwargs = self.cls.__getnewargs_ex__(v) # type: ignore
-            assert len(args) + len(kwargs) == len(self.argnames)
-            args += tuple(kwargs[name] for name in self.argnames[len(args):])
-        elif hasattr(self.cls, '__getnewargs__'):
-            args = self.cls.__getnewargs__(v) # type: ignore
-            assert len(args) == len(self.argnames)
-        elif dataclasses.is_dataclass(self.cls):
-            args = tuple(getattr(v, name) for name in self.argnames)
-        else:
-            raise error.SerializationError(f'cannot dump {v}')
-        dumps = [serializer.dumps(arg) for serializer, arg in zip(self.serializers, args)]
-        if len(self.argnames) == 1:
-            return util.protect_unbalanced(dumps[0]) or '{}' if self.npositional \
-              else util.protect_regex(self.argnames[0], '=') + '=' + util.protect_unbalanced(dumps[0])
+        args = self.getargs(v)
+        if len(self.prefixes) == 1:
+            s = util.protect_unbalanced(self.serializers[0].dumps(args[0]))
+            return s or '{}' if self.npositional else self.prefixes[0] + s
         else:
-            return ','.join(util.protect_regex(dumps[i], ',') if i < self.npositional
-              else util.protect_regex(self.argnames[i], ',|=') + '=' + util.protect_regex(dumps[i], ',') for i in range(len(self.argnames)))
+            return ','.join([prefix + _protectitem(serializer.dumps(arg)) for prefix, serializer, arg in zip(self.prefixes, self.serializers, args)])
 
     def __str__(self) -> str:
         return str(getattr(self.cls, '__name__', repr(self.cls)))
@@ -1,9 +1,14 @@
+import bisect
 import itertools
 import re
 import textwrap
+import types
 import typing
+import weakref
 from . import error
 
+T = typing.TypeVar('T')
+
 
 def safesplit(s: str, sep: str, maxsplit: int = -1) -> typing.List[str]:
     if not s:
@@ -18,6 +23,185 @@ def safesplit(s: str, sep: str, maxsplit: int = -1) -> typing.List[str]:
         level += part.count('{') - part.count('}')
     return parts
 
+
+_tokenpattern = re.compile(r'[{},=]')
+
+
+def tokenize(s: str, *, keepnodes: bool = False) -> 'Node':
+    return Node(Tokens(s, keepnodes=keepnodes), 0, len(s), 0)
+
+
+class Tokens:
+    '''Positions of all separators in a string, grouped by brace depth.
+
+    The string is scanned once, after which any substring that starts at a
+    known depth can be split without rescanning its characters. Unless
+    `keepnodes` is true, brace free nodes are reported by `Node.isflat` and
+    may be loaded from strings instead of nodes; users that identify parts by
+    their position, such as `Document`, need every part as a node. A string
+    without any braces is then not scanned until a node is split.'''
+
+    def __init__(self, text: str, *, keepnodes: bool = False) -> None:
+        self.text = text
+        self.keepnodes = keepnodes
+        self.flat = not keepnodes and '{' not in text and '}' not in text
+        self.separators: typing.Optional[typing.Dict[str, typing.Dict[int, typing.List[int]]]] = None
+        if not self.flat:
+            self.scan()
+
+    def scan(self) -> typing.Dict[str, typing.Dict[int, typing.List[int]]]:
+        'Locate the separators, store them as `separators` and return them.'
+
+        text = self.text
+        commas: typing.Dict[int, typing.List[int]] = {}
+        equals: typing.Dict[int, typing.List[int]] = {}
+        self.separators = separators = {',': commas, '=': equals}
+        # The position lists of the current depth are held in locals, such that
+        # the frequent separators cost a single append. Lists may remain empty.
+        depth = 0
+        commalist = commas.setdefault(0, [])
+        equallist = None
+        for m in _tokenpattern.finditer(text):
+            c = m.group()
+            if c == ',':
+                commalist.append(m.start())
+            elif c == '=':
+                if equallist is None:
+                    equallist = equals.setdefault(depth, [])
+                equallist.append(m.start())
+            else:
+                depth += 1 if c == '{' else -1
+                commalist = commas.setdefault(depth, [])
+                equallist = None
+        return separators
+
+
+class Node:
+    '''View on the substring `text[start:end]` of tokenized text, where `depth`
+    is the brace depth at `start`. The methods mirror `safesplit`, `unprotect`
+    and `splitarg`, but return nodes rather than strings.'''
+
+    __slots__ = 'tokens', 'start', 'end', 'depth'
+
+    def __init__(self, tokens: Tokens, start: int, end: int, depth: int) -> None:
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+        self.depth = depth
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __str__(self) -> str:
+        return self.tokens.text[self.start:self.end]
+
+    def __repr__(self) -> str:
+        return f'Node({str(self)!r})'
+
+    def isflat(self) -> bool:
+        'Return whether the substring contains no braces, such that `str.split` splits it like `split`.'
+
+        tokens = self.tokens
+        if tokens.flat or tokens.keepnodes:
+            return tokens.flat
+        text = tokens.text
+        return text.find('{', self.start, self.end) < 0 and text.find('}', self.start, self.end) < 0
+
+    def split(self, sep: str, maxsplit: int = -1) -> typing.List['Node']:
+        if self.start == self.end:
+            return []
+        # A separator splits `self` if its depth equals the depth at `start`,
+        # which is equivalent to the running brace level of `safesplit` being 0.
+        positions = (self.tokens.separators or self.tokens.scan())[sep].get(self.depth)
+        if not positions:
+            return [self]
+        i = bisect.bisect_left(positions, self.start)
+        j = bisect.bisect_left(positions, self.end, i)
+        if maxsplit >= 0:
+            j = min(j, i + maxsplit)
+        if i == j:
+            return [self]
+        ends = positions[i:j]
+        starts = [self.start]
+        starts.extend([end + 1 for end in ends])
+        ends.append(self.end)
+        return list(map(Node, itertools.repeat(self.tokens), starts, ends, itertools.repeat(self.depth)))
+
+    def unprotect(self) -> 'Node':
+        # Equivalent to `_protectedpattern.fullmatch` without scanning the body.
+        text = self.tokens.text
+        start = self.start
+        end = self.end
+        if end - start < 2 or text[start] != '{' or text[end-1] != '}':
+            return self
+        start += 1
+        end -= 1
+        depth = self.depth + 1
+        if text[start] == '<':
+            i = start + 1
+            while text[i] == '{':
+                i += 1
+            if text[i] == '>':
+                depth += i - start - 1
+                start = i + 1
+        if end - start >= 2 and text[end-1] == '>':
+            i = end - 2
+            while i >= start and text[i] == '}':
+                i -= 1
+            if i >= start and text[i] == '<':
+                end = i
+        return Node(self.tokens, start, end, depth)
+
+    def splitarg(self) -> typing.Tuple[str, 'Node']:
+        text = self.tokens.text
+        i = text.find('{', self.start, self.end)
+        if i < 0:
+            return str(self), Node(self.tokens, self.end, self.end, self.depth)
+        if i == self.end - 1 or text[self.end-1] != '}':
+            raise Exception(f'invalid joined argument {str(self)!r}')
+        depth = self.depth - text.count('}', self.start, i)
+        return text[self.start:i], Node(self.tokens, i, self.end, depth).unprotect()
+
+
+class Splitter:
+    '''Incremental `safesplit` of a string that arrives in chunks.
+
+    Every call to `feed` returns the parts that were completed by the chunk;
+    `close` returns the remaining part, if any. Only the part that is being
+    accumulated is held in memory.'''
+
+    def __init__(self, sep: str) -> None:
+        self._pattern = re.compile(r'[{}]|' + re.escape(sep))
+        self._level = 0
+        self._part: typing.List[str] = []
+        self._empty = True
+
+    def feed(self, chunk: str) -> typing.List[str]:
+        parts = []
+        start = 0
+        for m in self._pattern.finditer(chunk):
+            c = m.group()
+            if c == '{':
+                self._level += 1
+            elif c == '}':
+                self._level -= 1
+            elif not self._level:
+                self._part.append(chunk[start:m.start()])
+                parts.append(''.join(self._part))
+                self._part = []
+                start = m.end()
+        self._part.append(chunk[start:])
+        self._empty = self._empty and not chunk
+        return parts
+
+    def close(self) -> typing.List[str]:
+        if self._empty:
+            return []
+        part = ''.join(self._part)
+        self._part = []
+        return [part]
+
+
 _bracepattern = re.compile(r'([\{\}])')
 _prefixpattern = re.compile(r'^<\{*>')
 _suffixpattern = re.compile(r'<\}*>$')
@@ -32,8 +216,29 @@ def protect_unbalanced(s: str) -> str:
 
 
 def protect_regex(s: str, regex: str) -> str:
-    pattern = re.compile(regex)
-    return _protect(s, lambda part: pattern.search(part) is not None)
+    return protector(regex)(s)
+
+
+_protectors: typing.Dict[str, typing.Callable[[str], str]] = {}
+
+
+def protector(regex: str) -> typing.Callable[[str], str]:
+    try:
+        return _protectors[regex]
+    except KeyError:
+        pass
+    fastsearch = re.compile(r'[{}]|' + regex).search
+    search = re.compile(regex).search
+    def protect(s: str) -> str:
+        if fastsearch(s) is None:
+            return s
+        if '{' in s or '}' in s:
+            return _protect(s, lambda part: search(part) is not None)
+        # Without braces `s` needs no balancing but does contain a separator at
+        # level zero, so only the prefix and suffix rules of `_protect` apply.
+        return ('{<>' if _prefixpattern.search(s) else '{') + s + ('<>}' if _suffixpattern.search(s) else '}')
+    _protectors[regex] = protect
+    return protect
 
 
 def _protect(s: str, test: typing.Callable[[str], bool]) -> str:
@@ -76,34 +281,107 @@ def splitarg(s: str) -> typing.Tuple[str,str]:
 
 
 def prettify(s: str) -> str:
-    return _prettify(s, '')
-
-
-def _isnonnegativebalanced(s: str) -> bool:
-    depths = tuple(itertools.accumulate(1 if b == '{' else -1 for b in _bracepattern.findall(s)))
-    return not depths or all(depth >= 0 for depth in depths) and depths[-1] == 0
+    pretty: typing.List[str] = []
+    if '{' not in s and '}' not in s:
+        _prettifyleaves(pretty, s, '')
+        return ''.join(pretty)
+    commas, closing = _scan(s)
+    # Scopes are processed depth first as iterators over the (start, end)
+    # spans of their parts, together with the depth and indentation.
+    stack = [(_spans(commas, 0, len(s), 0), 0, '')]
+    while stack:
+        spans, depth, indent = stack[-1]
+        span = next(spans, None)
+        if span is None:
+            stack.pop()
+            continue
+        start, end = span
+        # A part is followed by an indented scope if it ends in a brace that
+        # matches the first opening brace, which is equivalent to the content
+        # in between being nonnegative and balanced.
+        i = s.find('{', start, end)
+        if i > start and s[end-1] == '}' and closing.get(i) == end - 1:
+            head = s[start:i]
+        else:
+            head = s[start:end]
+            i = -1
+        if head.startswith((' ', '>|')) or '\n' in head:
+            pretty.append(indent+'>|'+head.replace('\n', '\n'+indent+' |')+'\n')
+        else:
+            pretty.append(indent+head+'\n')
+        if i < 0:
+            pass
+        elif s.find('{', i+1, end-1) < 0:
+            # A balanced scope without braces consists of leaves only.
+            _prettifyleaves(pretty, s[i+1:end-1], indent+'  ')
+        else:
+            depth = depth - s.count('}', start, i) + 1
+            stack.append((_spans(commas, i+1, end-1, depth), depth, indent+'  '))
+    return ''.join(pretty)
 
 
-def _prettify(s: str, indent: str) -> str:
-    pretty = ''
-    for part in safesplit(s, ','):
-        i = part.find('{')
-        if i > 0 and part.endswith('}') and _isnonnegativebalanced(part[i+1:-1]):
-            scope = _prettify(part[i+1:-1], indent+'  ')
-            part = part[:i]
-        else:
-            scope = ''
-        if part.startswith((' ', '>|')) or '\n' in part:
-            pretty += indent+'>|'+part.replace('\n', '\n'+indent+' |')
+def _prettifyleaves(pretty: typing.List[str], s: str, indent: str) -> None:
+    # Append the lines of the parts of `s`, which does not contain braces.
+    if not s:
+        return
+    if '\n' in s or s.startswith((' ', '>|')) or ', ' in s or ',>|' in s:
+        for head in s.split(','):
+            if head.startswith((' ', '>|')) or '\n' in head:
+                pretty.append(indent+'>|'+head.replace('\n', '\n'+indent+' |')+'\n')
+            else:
+                pretty.append(indent+head+'\n')
+    else:
+        pretty.append(indent+s.replace(',', '\n'+indent)+'\n')
+
+
+def _scan(s: str) -> typing.Tuple[typing.Dict[int, typing.List[int]], typing.Dict[int, int]]:
+    # Comma positions by brace depth, and the position of the matching closing
+    # brace for every matched opening brace, in a single pass.
+    commas: typing.Dict[int, typing.List[int]] = {}
+    closing: typing.Dict[int, int] = {}
+    opening: typing.List[int] = []
+    depth = 0
+    commalist = commas.setdefault(0, [])
+    for i in map(re.Match.start, _prettifypattern.finditer(s)):
+        c = s[i]
+        if c == ',':
+            commalist.append(i)
         else:
-            pretty += indent+part
-        pretty += '\n'+scope
-    return pretty
+            if c == '{':
+                opening.append(i)
+                depth += 1
+            else:
+                if opening:
+                    closing[opening.pop()] = i
+                depth -= 1
+            commalist = commas.setdefault(depth, [])
+    return commas, closing
+
+_prettifypattern = re.compile(r'[{},]')
+
+
+def _spans(commas: typing.Mapping[int, typing.List[int]], start: int, end: int, depth: int) -> typing.Iterator[typing.Tuple[int, int]]:
+    # Spans of the parts of `s[start:end]` at `depth`, as in `Node.split`.
+    if start == end:
+        return iter(())
+    positions = commas.get(depth)
+    if not positions:
+        return iter([(start, end)])
+    i = bisect.bisect_left(positions, start)
+    j = bisect.bisect_left(positions, end, i)
+    ends = positions[i:j]
+    starts = [start]
+    starts.extend([end + 1 for end in ends])
+    ends.append(end)
+    return zip(starts, ends)
 
 
 def deprettify(pretty: str) -> str:
-    s = ''
+    # Only nonempty strings are appended to `s`, such that `not s` is true if
+    # and only if nothing has been written.
+    s: typing.List[str] = []
     lines = pretty.split('\n')
+    indents = [0]
     i = 0
     while i < len(lines):
         line = lines[i]
@@ -116,69 +394,111 @@ def deprettify(pretty: str) -> str:
         elif indent > indents[-1]:
             if indent - indents[-1] == 1:
                 raise ValueError(f'line {i+1}: indentation should be two or more spaces but got one')
-            s += '{'
+            s.append('{')
             indents.append(indent)
         else:
             while indents and indents[-1] != indent:
                 indents.pop()
-                s += '}'
+                s.append('}')
             if not indents or indent < indents[-1]:
                 raise ValueError(f'line {i+1}: dedent does not match previous indentation')
-            s += ','
-        if line.startswith(' '*indent+'>|'):
-            s += line[indent+2:]
+            s.append(',')
+        if line.startswith('>|', indent):
+            if len(line) > indent+2:
+                s.append(line[indent+2:])
             i += 1
-            while i < len(lines) and lines[i].startswith(' '*indent+' |'):
-                s += '\n'+lines[i][indent+2:]
+            continuation = ' '*indent+' |'
+            while i < len(lines) and lines[i].startswith(continuation):
+                s.append('\n')
+                s.append(lines[i][indent+2:])
                 i += 1
         else:
-            s += line[indent:]
+            if len(line) > indent:
+                s.append(line[indent:])
             i += 1
-    s += '}'*(len(indents)-1)
-    return s
+    s.append('}'*(len(indents)-1))
+    return ''.join(s)
+
+
+class _cachedproperty(typing.Generic[T]):
+    '''Property that is computed on first access and then stored on the instance.'''
+
+    def __init__(self, f: typing.Callable[[typing.Any], T]) -> None:
+        self.f = f
+        self.name = f.__name__
+
+    def __get__(self, obj: typing.Any, cls: typing.Any = None) -> T:
+        if obj is None:
+            return self # type: ignore
+        value = obj.__dict__[self.name] = self.f(obj)
+        return value
 
 
 class DocString:
+    '''Parsed docstring of a callable.
+
+    Instances are cached by the identity of the callable, which is referenced
+    weakly such that the cache does not keep classes or functions alive. All
+    properties are evaluated lazily and only once.'''
 
     directives: typing.ClassVar[typing.Pattern[str]] = re.compile(r'^[.][.] (arguments|presets)::\n(.*?)(?:\n(?!(?:   | *\n))|\Z)', flags=re.MULTILINE | re.DOTALL)
     noindent: typing.ClassVar[typing.Pattern[str]] = re.compile(r'\n(?=\S)')
 
-    def __init__(self, f: typing.Callable[..., typing.Any]) -> None:
+    _cache: typing.ClassVar[typing.Dict[typing.Tuple[type, int], typing.Tuple['weakref.ref[typing.Any]', 'DocString']]] = {}
+    _doc: str
+
+    def __new__(cls, f: typing.Callable[..., typing.Any]) -> 'DocString':
+        key = cls, id(f)
+        cached = cls._cache.get(key)
+        if cached and cached[0]() is f:
+            return cached[1]
+        self = super().__new__(cls)
         head, sep, tail = (f.__doc__ or '').partition('\n')
         self._doc = (head + sep + textwrap.dedent(tail)).strip()
+        try:
+            ref = weakref.ref(f, lambda ref: DocString._cache.pop(key, None))
+        except TypeError: # f does not support weak references
+            pass
+        else:
+            cls._cache[key] = ref, self
+        return self
+
+    @_cachedproperty
+    def _directives(self) -> typing.Mapping[str, typing.List[typing.Tuple[str, str]]]:
+        d: typing.Dict[str, typing.List[typing.Tuple[str, str]]] = {'arguments': [], 'presets': []}
+        for n, s in self.directives.findall(self._doc):
+            d[n].extend(item.partition('\n')[::2] for item in self.noindent.split(textwrap.dedent(s).lstrip('\n')))
+        return d
 
-    def _directive(self, name: str) -> typing.List[typing.Tuple[str, str]]:
-        return [item.partition('\n')[::2] for n, s in self.directives.findall(self._doc) if n == name for item in self.noindent.split(textwrap.dedent(s).lstrip('\n'))]
-
-    @property
+    @_cachedproperty
     def text(self) -> str:
         return '\n\n'.join(s.strip() for s in self.directives.split(self._doc)[::3] if s.strip())
 
-    @property
+    @_cachedproperty
     def defaults(self) -> typing.Mapping[str, str]:
         d = {}
-        for name, body in self._directive('arguments'):
+        for name, body in self._directives['arguments']:
             if name.endswith(']'):
                 k, v = name[:-1].split(' [', 1)
                 d[k] = v
-        return d
+        return types.MappingProxyType(d)
 
-    @property
+    @_cachedproperty
     def argdocs(self) -> typing.Mapping[str, str]:
-        return {name.split(' [')[0] if name.endswith(']') else name: textwrap.dedent(body).rstrip() for name, body in self._directive('arguments')}
+        return types.MappingProxyType({name.split(' [')[0] if name.endswith(']') else name: textwrap.dedent(body).rstrip() for name, body in self._directives['arguments']})
 
-    @property
+    @_cachedproperty
     def presets(self) -> typing.Mapping[str, typing.Mapping[str, str]]:
         p: typing.Dict[str, typing.Mapping[str, str]] = {}
-        for name, body in self._directive('presets'):
+        for name, body in self._directives['presets']:
             v: typing.Dict[str, str] = {}
-            for si in safesplit(deprettify(body), ','):
-                parts = safesplit(si, '=', 1)
+            for si in tokenize(deprettify(body)).split(','):
+                parts = si.split('=', 1)
                 if len(parts) != 2:
-                    raise error.SerializationError(f'preset {name!r} has not value for argument {unprotect(si)!r}')
-                v[unprotect(parts[0])] = unprotect(parts[1])
-            p[name] = v
-        return p
+                    raise error.SerializationError(f'preset {name!r} has not value for argument {str(si.unprotect())!r}')
+                v[str(parts[0].unprotect())] = str(parts[1].unprotect())
+            p[name] = types.MappingProxyType(v)
+        return types.MappingProxyType(p)
 
     def __str__(self) -> str:
         return self._doc
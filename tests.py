@@ -1,12 +1,31 @@
+import asyncio
+import concurrent.futures
+import contextlib
 import dataclasses
 import decimal
 import enum
+import gc
+import importlib
+import io
+import itertools
 import pathlib
+import re
 import stringly
+import subprocess
 import sys
+import tempfile
 import textwrap
+import threading
 import typing
 import unittest
+import unittest.mock
+import weakref
+
+try:
+    import numpy
+    import numpy.typing
+except ImportError:
+    numpy = None
 
 
 class Protect(unittest.TestCase):
@@ -56,6 +75,20 @@ class Protect(unittest.TestCase):
         self.assertProtected('ab{c,d}ef', 'ab{c,d}ef')
         self.assertProtected('a{b,c}d,ef', '{a{b,c}d,ef}')
 
+    def test_protector(self):
+        protect = stringly.util.protector(',|=')
+        self.assertIs(stringly.util.protector(',|='), protect)
+        self.assertEqual(protect('abc'), 'abc')
+        self.assertEqual(protect('a=b'), '{a=b}')
+        self.assertEqual(protect('<>,'), '{<><>,}')
+        self.assertEqual(protect('{a=b}'), '{{a=b}}')
+        self.assertEqual(stringly.util.protect_regex(',\nb<>\n', ','), '{,\nb<>\n<>}')
+        search = re.compile(',').search
+        for length in range(6):
+            for chars in itertools.product(',<>\nx', repeat=length):
+                s = ''.join(chars)
+                self.assertEqual(stringly.util.protect_regex(s, ','), stringly.util._protect(s, lambda part: search(part) is not None))
+
     def test_braces(self):
         self.assertProtected('{abc}', '{{abc}}')
         self.assertProtected('{abc{', '{{abc{<}}>}')
@@ -83,6 +116,94 @@ class Protect(unittest.TestCase):
         self.assertProtected('<>,<>', '{<><>,<><>}')
 
 
+class Tokenize(unittest.TestCase):
+
+    def test_leaf(self):
+        # Leaf serializers never split their argument and must not tokenize it.
+        class E(enum.Enum):
+            a = 1
+        with unittest.mock.patch.object(stringly.util, 'tokenize', side_effect=AssertionError('tokenized')):
+            self.assertEqual(stringly.loads(str, 'a{b,c'), 'a{b,c')
+            self.assertEqual(stringly.loads(int, '12345'), 12345)
+            self.assertEqual(stringly.loads(bool, 'yes'), True)
+            self.assertEqual(stringly.loads(E, 'a'), E.a)
+
+    def assertEquivalent(self, node):
+        s = str(node)
+        for sep in ',=':
+            for maxsplit in -1, 1:
+                parts = node.split(sep, maxsplit)
+                self.assertEqual(list(map(str, parts)), stringly.util.safesplit(s, sep, maxsplit))
+        for part in node.split(','):
+            inner = part.unprotect()
+            self.assertEqual(str(inner), stringly.util.unprotect(str(part)))
+            self.assertEqual(list(map(str, inner.split(','))), stringly.util.safesplit(str(inner), ','))
+
+    def test_combinations(self):
+        for length in range(6):
+            for i in range(6**length):
+                self.assertEquivalent(stringly.util.tokenize(''.join('{}<>,='[i//6**j%6] for j in range(length))))
+
+    def test_nested(self):
+        node = stringly.util.tokenize('a={b={c,d},e},f')
+        a, f = node.split(',')
+        self.assertEqual(str(f), 'f')
+        name, value = a.split('=', 1)
+        self.assertEqual(str(name), 'a')
+        b, e = value.unprotect().split(',')
+        self.assertEqual(str(e), 'e')
+        self.assertEqual(list(map(str, b.split('=', 1)[1].unprotect().split(','))), ['c', 'd'])
+
+    def test_views(self):
+        node = stringly.util.tokenize('x,{a,b}')
+        inner = node.split(',')[1].unprotect()
+        self.assertIs(inner.tokens, node.tokens)
+        self.assertEqual((inner.start, inner.end), (3, 6))
+        a, b = inner.split(',')
+        self.assertIs(a.split(',')[0], a)
+        self.assertIs(inner.split('=')[0], inner)
+
+    def test_splitarg(self):
+        name, value = stringly.util.tokenize('a{b,c}').splitarg()
+        self.assertEqual(name, 'a')
+        self.assertEqual(list(map(str, value.split(','))), ['b', 'c'])
+        with self.assertRaisesRegex(Exception, 'invalid joined argument'):
+            stringly.util.tokenize('a{b').splitarg()
+
+    def test_unscanned(self):
+        # Brace free text is split by `str.split`, and only scanned for
+        # separators once a node is split.
+        node = stringly.util.tokenize('a=1,b=2')
+        self.assertEqual(stringly.serializer.get(typing.Dict[str, int]).loadnode(node), {'a': 1, 'b': 2})
+        self.assertIsNone(node.tokens.separators)
+        self.assertEqual(list(map(str, node.split(','))), ['a=1', 'b=2'])
+        self.assertIsNotNone(node.tokens.separators)
+        self.assertIsNotNone(stringly.util.tokenize('a,b', keepnodes=True).tokens.separators)
+
+    def test_flat(self):
+        # Brace free nodes and parts are loaded from strings, which must give
+        # the same values and errors as loading every part from a node.
+        @dataclasses.dataclass
+        class One:
+            a: str
+        @dataclasses.dataclass
+        class Two:
+            a: str
+            b: str = 'b'
+        def load(z, node):
+            try:
+                return z.loadnode(node)
+            except Exception as e:
+                return type(e), str(e)
+        for t in typing.List[str], typing.Tuple[str, ...], typing.Tuple[str, str], typing.Dict[str, str], One, Two:
+            z = stringly.serializer.get(t)
+            for length in range(5):
+                for s in map(''.join, itertools.product('ab,={}', repeat=length)):
+                    node = stringly.util.tokenize(s)
+                    self.assertEqual(node.isflat(), '{' not in s and '}' not in s)
+                    self.assertEqual(load(z, node), load(z, stringly.util.tokenize(s, keepnodes=True)), (t, s))
+
+
 class PrettifyUglify(unittest.TestCase):
 
     def check(self, s, pretty):
@@ -122,6 +243,14 @@ class PrettifyUglify(unittest.TestCase):
     def test_all_indented(self):
         self.assertEqual(stringly.util.deprettify('  a=b\n  c=\n    d\n'), 'a=b,c={d}')
 
+    def test_empty(self):
+        self.check('', '')
+        self.assertEqual(stringly.util.deprettify('\n\n'), '')
+
+    def test_deep(self):
+        s = 'a{'*2000 + 'b' + '}'*2000
+        self.assertEqual(stringly.util.deprettify(stringly.util.prettify(s)), s)
+
     def test_invalid_dedent(self):
         with self.assertRaisesRegex(ValueError, 'line 3: dedent does not match previous indentation'):
             stringly.util.deprettify('a=\n  b\n c\n')
@@ -144,6 +273,9 @@ class Bool(unittest.TestCase):
         self.assertEqual(stringly.loads(bool, 'false'), False)
         self.assertEqual(stringly.loads(bool, 'no'), False)
         self.assertEqual(stringly.loads(bool, 'NO'), False)
+        self.assertEqual(stringly.loads(bool, 'yEs'), True)
+        with self.assertRaisesRegex(stringly.error.SerializationError, "invalid boolean value 'maybe'"):
+            stringly.loads(bool, 'maybe')
 
     def test_dumps(self):
         self.assertEqual(stringly.dumps(bool, True), 'True')
@@ -178,8 +310,20 @@ class Int(unittest.TestCase):
         with self.assertRaisesRegex(stringly.error.SerializationError, '1j <complex> is not an instance of int or bool'):
             stringly.dumps(int, 1j)
 
+    def test_items(self):
+        class E(enum.IntEnum):
+            a = 3
+        self.assertEqual(stringly.dumps(typing.List[int], [1, True, E.a]), '1,1,3')
+        self.assertEqual(stringly.dumps(typing.List[int], (v for v in [1, True])), '1,1')
+        self.assertEqual(stringly.loads(typing.List[int], '1,{2},3'), [1, 2, 3])
+        with self.assertRaisesRegex(stringly.error.SerializationError, '1.0 <float> is not an instance of int or bool'):
+            stringly.dumps(typing.List[int], [1, 1.0])
+        with self.assertRaisesRegex(stringly.error.SerializationError, "invalid literal for int\\(\\) with base 10: ''"):
+            stringly.loads(typing.List[int], '1,,2')
+
     def test_serializer(self):
         s = stringly.serializer.get(int)
+        self.assertIsInstance(s, stringly.serializer.Int)
         self.assertIsInstance(s, stringly.serializer.Native)
         self.assertEqual(str(s), 'int')
 
@@ -206,8 +350,23 @@ class Float(unittest.TestCase):
         with self.assertRaisesRegex(stringly.error.SerializationError, '1j <complex> is not an instance of float or int or bool'):
             stringly.dumps(float, 1j)
 
+    def test_dumps_subclass(self):
+        class F(float):
+            def __repr__(self):
+                return 'F'
+        self.assertEqual(stringly.dumps(float, F(2.)), '2')
+
+    def test_items(self):
+        self.assertEqual(stringly.dumps(typing.Tuple[float, ...], (1., 2.5, -0., 10., 1e16, 3, True)), '1,2.5,-0,10,1e+16,3,1')
+        self.assertEqual(stringly.dumps(typing.List[float], (v for v in [1.5, 3])), '1.5,3')
+        self.assertEqual(stringly.loads(typing.Tuple[float, ...], '1,2.5,{3}'), (1., 2.5, 3.))
+        self.assertEqual(stringly.loads(typing.Tuple[float, ...], ''), ())
+        with self.assertRaises(stringly.error.SerializationError):
+            stringly.loads(typing.Tuple[float, ...], '1,a')
+
     def test_serializer(self):
         s = stringly.serializer.get(float)
+        self.assertIsInstance(s, stringly.serializer.Float)
         self.assertIsInstance(s, stringly.serializer.Native)
         self.assertEqual(str(s), 'float')
 
@@ -233,8 +392,13 @@ class Complex(unittest.TestCase):
         self.assertEqual(stringly.dumps(complex, 1+0j), '1')
         self.assertEqual(stringly.dumps(complex, 1+2j), '1+2j')
 
+    def test_items(self):
+        self.assertEqual(stringly.dumps(typing.List[complex], [1j, 1+0j, 2., 3]), '1j,1,2,3')
+        self.assertEqual(stringly.loads(typing.List[complex], '1j,1'), [1j, 1])
+
     def test_serializer(self):
         s = stringly.serializer.get(complex)
+        self.assertIsInstance(s, stringly.serializer.Complex)
         self.assertIsInstance(s, stringly.serializer.Native)
         self.assertEqual(str(s), 'complex')
 
@@ -275,12 +439,54 @@ class Decimal(unittest.TestCase):
         self.assertEqual(str(s), 'Decimal')
 
 
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class NDArray(unittest.TestCase):
+
+    def test_loads(self):
+        v = stringly.loads(numpy.ndarray, '1,2.5,-0,1e+16,inf')
+        self.assertEqual(v.dtype, numpy.float64)
+        self.assertEqual(v.tolist(), [1., 2.5, -0., 1e16, float('inf')])
+        self.assertEqual(stringly.loads(numpy.ndarray, '').shape, (0,))
+        self.assertEqual(stringly.loads(numpy.typing.NDArray[numpy.int64], '{1},2').tolist(), [1, 2])
+        with self.assertRaises(stringly.error.SerializationError):
+            stringly.loads(numpy.typing.NDArray[numpy.int64], '1,2.5')
+
+    def test_dumps(self):
+        v = numpy.array([1., 2.5, -0., 1e16, .1])
+        self.assertEqual(stringly.dumps(numpy.ndarray, v), '1,2.5,-0,1e+16,0.1')
+        self.assertEqual(stringly.dumps(numpy.ndarray, v), stringly.dumps(typing.Tuple[float, ...], tuple(v.tolist())))
+        self.assertEqual(stringly.dumps(numpy.ndarray, numpy.arange(3)), '0,1,2')
+        self.assertEqual(stringly.dumps(numpy.typing.NDArray[numpy.int64], numpy.arange(3)), '0,1,2')
+        with self.assertRaises(stringly.error.SerializationError):
+            stringly.dumps(numpy.typing.NDArray[numpy.int64], v)
+        with self.assertRaises(stringly.error.SerializationError):
+            stringly.dumps(numpy.ndarray, numpy.zeros((2, 2)))
+
+    def test_roundtrip(self):
+        v = numpy.random.default_rng(0).standard_normal(1000)
+        self.assertTrue(numpy.array_equal(stringly.loads(numpy.ndarray, stringly.dumps(numpy.ndarray, v)), v))
+
+    def test_nested(self):
+        t = typing.List[numpy.typing.NDArray[numpy.int64]]
+        self.assertEqual(stringly.dumps(t, [numpy.arange(2), numpy.arange(3)]), '{0,1},{0,1,2}')
+        self.assertEqual([v.tolist() for v in stringly.loads(t, '{0,1},{0,1,2}')], [[0, 1], [0, 1, 2]])
+
+    def test_serializer(self):
+        self.assertEqual(str(stringly.serializer.get(numpy.ndarray)), 'numpy.typing.NDArray[numpy.float64]')
+        self.assertEqual(str(stringly.serializer.get(numpy.typing.NDArray[numpy.int32])), 'numpy.typing.NDArray[numpy.int32]')
+        with self.assertRaises(ValueError):
+            stringly.serializer.get(numpy.typing.NDArray[numpy.str_])
+
+
 class Typing(unittest.TestCase):
 
     def check(self, t, v, s, strt=None):
         self.assertEqual(stringly.dumps(t, v), s)
         self.assertEqual(stringly.loads(t, s), v)
         self.assertEqual(str(stringly.serializer.get(t)), strt or str(t))
+        compiled = stringly.compile(t)
+        self.assertEqual(compiled.dumps(v), s)
+        self.assertEqual(compiled.loads(s), v)
 
     def test_tuple(self):
         self.check(typing.Tuple[str], ('',), '{}')
@@ -334,6 +540,16 @@ class Typing(unittest.TestCase):
         self.check(typing.Union[str,complex,int], 1, 'complex{1}')
         self.check(typing.Union[str,int,complex], 2j, 'complex{2j}')
 
+    def test_union_dispatch(self):
+        class A(int):
+            pass
+        t = typing.Union[str,complex,bool,typing.List[int]]
+        self.check(t, True, 'complex{1}', 'typing.Union[str, complex, bool, typing.List[int]]')
+        self.check(t, [1], 'List{1}', 'typing.Union[str, complex, bool, typing.List[int]]')
+        self.assertEqual(stringly.dumps(t, A(2)), 'complex{2}')
+        with self.assertRaisesRegex(stringly.error.SerializationError, 'failed to find matching serializer'):
+            stringly.dumps(typing.Union[str,int], None)
+
     def test_union_empty_value(self):
         self.check(typing.Union[str,complex], '', 'str')
 
@@ -360,6 +576,44 @@ class Typing(unittest.TestCase):
         self.check(t, t(a=1, b='2,3'), 'a=1,b={2,3}', 't')
         self.assertEqual(stringly.loads(t, 'a=1'), t(a=1))
 
+    def test_docstring_defaults(self):
+        class Counted:
+            count = 0
+            @staticmethod
+            def __stringly_loads__(s):
+                Counted.count += 1
+                return int(s)
+            @staticmethod
+            def __stringly_dumps__(v):
+                return str(v)
+        @dataclasses.dataclass
+        class t:
+            '''Text.
+
+            .. arguments::
+
+               a [1]
+               b [2,3]
+            '''
+            a: Counted
+            b: typing.List[int]
+        v1 = stringly.loads(t, '')
+        v2 = stringly.loads(t, '')
+        self.assertEqual(v1, t(1, [2,3]))
+        self.assertEqual(Counted.count, 1)
+        self.assertIsNot(v1.b, v2.b)
+        self.assertEqual(stringly.loads(t, 'a=4'), t(4, [2,3]))
+        self.assertEqual(Counted.count, 2)
+
+    def test_invalid_argument(self):
+        t = dataclasses.make_dataclass('t', [('a', int), ('b', int)])
+        with self.assertRaisesRegex(stringly.error.SerializationError, "invalid argument 'c'"):
+            stringly.loads(t, 'a=1,c=2')
+        with self.assertRaisesRegex(stringly.error.SerializationError, "duplicate argument 'a'"):
+            stringly.loads(t, 'a=1,b=2,a=3')
+        with self.assertRaisesRegex(stringly.error.SerializationError, 'invalid expression'):
+            stringly.loads(t, '1,2')
+
     def test_namedtuple(self):
         if sys.version_info < (3,6,1):
             self.skipTest('NamedTuple not support by stringly for Python < 3.6.1')
@@ -459,6 +713,21 @@ class Typing(unittest.TestCase):
             bar = 2
         self.check(t, t.foo, 'foo', 't')
         self.check(t, t.bar, 'bar', 't')
+        for s in 'Foo', '1':
+            with self.assertRaisesRegex(stringly.error.SerializationError, f"invalid t value '{s}'"):
+                stringly.loads(t, s)
+
+    def test_enum_aliases(self):
+        class t(enum.Enum):
+            __stringly_aliases__ = True
+            foo = 1
+            Bar = 'baz'
+            baz = 3
+        for s, v in ('foo', t.foo), ('1', t.foo), ('FOO', t.foo), ('Bar', t.Bar), ('bar', t.Bar), ('baz', t.baz), ('3', t.baz):
+            self.assertIs(stringly.loads(t, s), v)
+        self.assertEqual(stringly.dumps(t, t.foo), 'foo')
+        with self.assertRaises(stringly.error.SerializationError):
+            stringly.loads(t, '2')
 
     def test_custom(self):
         class Custom:
@@ -482,6 +751,722 @@ class Typing(unittest.TestCase):
         self.check(Custom, 1, 'int{1}', 'Custom')
 
 
+class Compile(unittest.TestCase):
+
+    def assertSameError(self, f, *args):
+        with self.assertRaises(Exception) as interpreted:
+            getattr(stringly, f)(*args)
+        with self.assertRaises(type(interpreted.exception)) as compiled:
+            getattr(stringly.compile(args[0]), f)(*args[1:])
+        self.assertEqual(str(compiled.exception), str(interpreted.exception))
+
+    def test_source(self):
+        compiled = stringly.compile(typing.List[int])
+        self.assertIn('def loads(s):', compiled.source)
+        self.assertEqual(str(compiled), 'typing.List[int]')
+
+    def test_errors(self):
+        t = dataclasses.make_dataclass('t', [('a', int), ('b', typing.Tuple[int,bool]), ('c', typing.Dict[str,int], dataclasses.field(default_factory=dict))])
+        for s in 'a=x,b={1,yes}', 'b={1,yes}', 'a=1,d=2', 'a=1,a=2,b={1,yes}', '1,2', 'a=1,b=1', 'a=1,b={1,maybe}', 'a=1,b={1,no},c=x':
+            self.assertSameError('loads', t, s)
+        self.assertSameError('dumps', t, t(1, (2,'no')))
+        self.assertSameError('dumps', t, t(1, (2,)))
+        self.assertSameError('dumps', typing.Union[int,str], None)
+        self.assertSameError('loads', typing.Union[int,str], 'float{1}')
+        class e(enum.Enum):
+            __stringly_aliases__ = True
+            foo = 1
+        for s in 'bar', 'Bar', '2':
+            self.assertSameError('loads', e, s)
+
+    def test_enum_aliases(self):
+        class e(enum.Enum):
+            __stringly_aliases__ = True
+            foo = 1
+            Bar = 2
+        compiled = stringly.compile(typing.List[e])
+        self.assertEqual(compiled.loads('foo,FOO,1,Bar,bar,2'), [e.foo, e.foo, e.foo, e.Bar, e.Bar, e.Bar])
+
+    def test_deep(self):
+        t = int
+        for i in range(30):
+            t = typing.Optional[typing.List[t]]
+        v = [[[]]]
+        self.assertEqual(stringly.compile(t).dumps(v), stringly.dumps(t, v))
+        self.assertEqual(stringly.compile(t).loads(stringly.dumps(t, v)), v)
+
+
+class Profile(unittest.TestCase):
+
+    def setUp(self):
+        @dataclasses.dataclass
+        class Mesh:
+            refine: int
+            size: typing.Tuple[float, ...] = (1.,)
+        @dataclasses.dataclass
+        class Solver:
+            mesh: Mesh
+            opts: typing.Dict[str, typing.Optional[int]]
+        self.Solver = Solver
+
+    def test_records(self):
+        with stringly.profile() as p:
+            for i in range(3):
+                v = stringly.loads(self.Solver, 'mesh={refine=2,size={1,2.5}},opts={a=1,b=}')
+            self.assertEqual(stringly.dumps(self.Solver, v), 'mesh={refine=2,size={1,2.5}},opts={a=1,b=}')
+        stringly.loads(self.Solver, 'mesh={refine=2},opts=')
+        self.assertEqual(p.records['Solver', 'loads'].ncalls, 3)
+        self.assertEqual(p.records['Solver', 'loads'].nbytes, 3*len('mesh={refine=2,size={1,2.5}},opts={a=1,b=}'))
+        self.assertEqual(p.records['Solver.mesh.refine', 'loads'].ncalls, 3)
+        self.assertEqual(p.records['Solver.mesh.size[]', 'loads'].ncalls, 6)
+        self.assertEqual(p.records['Solver.opts.key', 'loads'].ncalls, 6)
+        self.assertEqual(p.records['Solver.opts[]?', 'loads'].ncalls, 3)
+        self.assertEqual(p.records['Solver.mesh.size', 'dumps'].ncalls, 1)
+        self.assertEqual(p.records['Solver.mesh.size', 'dumps'].nbytes, len('1,2.5'))
+        for r in p.records.values():
+            self.assertLessEqual(r.tottime, r.cumtime)
+        self.assertIn('loads Solver.mesh.refine', p.table())
+        self.assertNotIn('loads Solver.mesh.refine', stringly.profile().table())
+
+    def test_pstats(self):
+        import pstats
+        with stringly.profile() as p:
+            stringly.loads(self.Solver, 'mesh={refine=2},opts=')
+        stats = pstats.Stats(p).stats
+        self.assertEqual(stats['Solver.mesh', 0, 'loads'][:2], (1, 1))
+        self.assertEqual(list(stats['Solver.mesh', 0, 'loads'][4]), [('Solver', 0, 'loads')])
+        self.assertEqual(stats['Solver', 0, 'loads'][4], {})
+
+    def test_restore(self):
+        get = stringly._get
+        with self.assertRaises(stringly.error.SerializationError):
+            with stringly.profile() as p:
+                stringly.loads(self.Solver, 'mesh={refine=x},opts=')
+        self.assertIs(stringly._get, get)
+        self.assertEqual(p.records['Solver.mesh.refine', 'loads'].ncalls, 1)
+        self.assertEqual(p._childtimes, [])
+
+    def test_union(self):
+        t = typing.List[typing.Union[int, str]]
+        with stringly.profile() as p:
+            self.assertEqual(stringly.dumps(t, [1, 'a']), 'int{1},str{a}')
+            self.assertEqual(stringly.loads(t, 'int{1},str{a}'), [1, 'a'])
+        self.assertEqual(p.records['typing.List[typing.Union[int, str]][].int', 'dumps'].ncalls, 1)
+        self.assertEqual(p.records['typing.List[typing.Union[int, str]][].str', 'loads'].ncalls, 1)
+
+    def test_mapchildren(self):
+        s = stringly.serializer.get(typing.Dict[str, typing.List[int]])
+        labels = []
+        r = stringly.serializer.mapchildren(s, lambda label, z: labels.append(label) or z)
+        self.assertEqual(labels, ['.key', '[]'])
+        self.assertIsNot(r, s)
+        self.assertIs(r.valueserializer, s.valueserializer)
+        self.assertIs(stringly.serializer.mapchildren(s.keyserializer, None), s.keyserializer)
+
+
+class Document(unittest.TestCase):
+
+    def setUp(self):
+        self.loaded = loaded = []
+        class C(str):
+            @staticmethod
+            def __stringly_loads__(s):
+                loaded.append(s)
+                return C(s)
+            @staticmethod
+            def __stringly_dumps__(v):
+                return str(v)
+        @dataclasses.dataclass
+        class Item:
+            name: C
+            values: typing.List[C]
+        self.t = typing.Dict[str, Item]
+        self.C = C
+        self.Item = Item
+
+    def test_update(self):
+        text = 'a={name=x,values={1,2}},b={name=y,values={3,4}},c={name=z,values=5}'
+        doc = stringly.Document(self.t, text)
+        self.assertEqual(len(self.loaded), 8)
+        self.assertEqual(doc.value, stringly.loads(self.t, text))
+        a = doc.value['a']
+        c = doc.value['c']
+        self.loaded.clear()
+        text = text.replace('values={3,4}', 'values={3,40,41}')
+        value = doc.update(text)
+        self.assertEqual(sorted(self.loaded), ['40', '41'])
+        self.assertEqual(value, stringly.loads(self.t, text))
+        self.assertIs(doc.value['a'], a)
+        self.assertIs(doc.value['c'], c) # shifted by the edit
+        self.assertEqual(doc.text, text)
+        self.loaded.clear()
+        doc.update(text)
+        self.assertEqual(self.loaded, [])
+
+    def test_pretty(self):
+        value = {'a': self.Item(self.C('x'), [self.C('1')]), 'b': self.Item(self.C('y'), [self.C('2')])}
+        text = stringly.dumps(self.t, value, pretty=True)
+        doc = stringly.Document(self.t, text, pretty=True)
+        self.assertEqual(doc.value, value)
+        self.loaded.clear()
+        doc.update(text.replace('y', 'yy'))
+        self.assertEqual(self.loaded, ['yy'])
+        self.assertEqual(doc.value['b'].name, 'yy')
+
+    def test_error(self):
+        doc = stringly.Document(typing.List[int], '1,2,3')
+        with self.assertRaises(stringly.error.SerializationError):
+            doc.update('1,x,3')
+        self.assertEqual(doc.value, [1,2,3])
+        self.assertEqual(doc.text, '1,2,3')
+        self.assertEqual(doc.update('1,2,4'), [1,2,4])
+
+    def test_docstring_default(self):
+        for T in typing.List[str], typing.Tuple[str, ...]:
+            @dataclasses.dataclass
+            class A:
+                """Test.
+
+                .. arguments::
+
+                   b [x,y]
+                """
+                b: T
+            x = T.__origin__(['x', 'y'])
+            doc = stringly.Document(typing.List[A], 'b=a')
+            self.assertEqual(doc.update('b=ab,'), [A(T.__origin__(['ab'])), A(x)])
+            self.assertEqual(doc.update('b=ab,,'), [A(T.__origin__(['ab'])), A(x), A(x)])
+            self.assertEqual(stringly.loads(A, ''), A(x))
+
+
+class Cache(unittest.TestCase):
+
+    def setUp(self):
+        stringly.serializer.cache_clear()
+
+    def test_identity(self):
+        self.assertIs(stringly.serializer.get(typing.List[int]), stringly.serializer.get(typing.List[int]))
+        info = stringly.serializer.cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 2)
+
+    def test_shared(self):
+        t = dataclasses.make_dataclass('t', [('a', typing.List[int]), ('b', typing.List[int])])
+        s = stringly.serializer.get(t)
+        self.assertIs(s.serializers[0], s.serializers[1])
+        self.assertIs(s.serializers[0], stringly.serializer.get(typing.List[int]))
+
+    def test_union_order(self):
+        self.assertEqual(str(stringly.serializer.get(typing.Union[int,str])), 'typing.Union[int, str]')
+        self.assertEqual(str(stringly.serializer.get(typing.Union[str,int])), 'typing.Union[str, int]')
+        if sys.version_info >= (3, 9):
+            self.assertEqual(str(stringly.serializer.get(list[typing.Union[int,str]]).itemserializer), 'typing.Union[int, str]')
+            self.assertEqual(str(stringly.serializer.get(list[typing.Union[str,int]]).itemserializer), 'typing.Union[str, int]')
+
+    def test_equal(self):
+        t1 = typing.Dict[str, typing.List[int]]
+        t2 = typing.Dict[str, typing.List[int]].copy_with((str, typing.List[int]))
+        self.assertIsNot(t1, t2)
+        self.assertIs(stringly.serializer.get(t1), stringly.serializer.get(t2))
+        info = stringly.serializer.cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 4)
+
+    def test_deep(self):
+        t = int
+        for i in range(400):
+            t = typing.List[t]
+        self.assertEqual(stringly.dumps(t, [[[]]]), '{{}}')
+
+    def test_unhashable(self):
+        class meta(type):
+            def __eq__(self, other):
+                return self is other
+        t = meta('t', (), {'__init__': lambda self, a=1: None, '__getnewargs__': lambda self: (1,)})
+        with self.assertRaises(TypeError):
+            hash(t)
+        self.assertEqual(stringly.dumps(t, t()), 'a=1')
+        self.assertEqual(stringly.serializer.cache_info().currsize, 1)
+
+    def test_clear(self):
+        stringly.serializer.get(int)
+        stringly.serializer.cache_clear()
+        self.assertEqual(stringly.serializer.cache_info().currsize, 0)
+
+    def test_scalars(self):
+        s = stringly.serializer.get(float)
+        stringly.serializer.cache_clear()
+        self.assertIs(stringly.serializer.get(float), s)
+        self.assertFalse(hasattr(s, '__dict__'))
+
+    def test_interned(self):
+        s = stringly.serializer.get(typing.Dict[str, typing.Optional[int]])
+        stringly.serializer.cache_clear()
+        self.assertIs(stringly.serializer.get(typing.Dict[str, typing.Optional[int]]), s)
+        self.assertIs(stringly.serializer.get(typing.Optional[int]), s.valueserializer)
+
+    def test_layout(self):
+        t1 = dataclasses.make_dataclass('t1', [('a', int), ('b', float)])
+        t2 = dataclasses.make_dataclass('t2', [('a', str), ('b', bool)])
+        s1 = stringly.serializer.get(t1)
+        s2 = stringly.serializer.get(t2)
+        self.assertIs(s1.argindex, s2.argindex)
+        self.assertIs(s1.prefixes, s2.prefixes)
+        self.assertFalse(hasattr(s1, '__dict__'))
+
+
+class SchemaCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(stringly.schemacache.set_directory, stringly.schemacache.get_directory())
+        self.addCleanup(stringly.serializer.cache_clear)
+        stringly.schemacache.set_directory(pathlib.Path(self.tmp.name) / 'cache')
+        sys.path.insert(0, self.tmp.name)
+        self.addCleanup(sys.path.remove, self.tmp.name)
+        self.addCleanup(sys.modules.pop, 'stringly_schemacache_test', None)
+
+    def module(self, source):
+        path = pathlib.Path(self.tmp.name) / 'stringly_schemacache_test.py'
+        path.write_text(textwrap.dedent(source))
+        sys.modules.pop('stringly_schemacache_test', None)
+        importlib.invalidate_caches()
+        return importlib.import_module('stringly_schemacache_test')
+
+    def test_roundtrip(self):
+        m = self.module('''
+            import dataclasses, typing
+            @dataclasses.dataclass
+            class A:
+                """Test.
+
+                .. arguments::
+
+                   b [x]
+                """
+                a: typing.List[int]
+                b: str
+        ''')
+        self.assertIsNone(stringly.schemacache.load(m.A))
+        stringly.serializer.cache_clear()
+        self.assertEqual(stringly.dumps(m.A, m.A([1,2], 'y')), 'a={1,2},b=y')
+        self.assertEqual(stringly.schemacache.load(m.A), {'b': 'x'})
+        stringly.serializer.cache_clear()
+        self.assertEqual(stringly.loads(m.A, 'a=3'), m.A([3], 'x'))
+
+    def test_invalidate(self):
+        m = self.module('''
+            import dataclasses
+            @dataclasses.dataclass
+            class A:
+                """Test.
+
+                .. arguments::
+
+                   a [1]
+                """
+                a: int
+        ''')
+        stringly.serializer.get(m.A)
+        self.assertIsNotNone(stringly.schemacache.load(m.A))
+        m = self.module('''
+            import dataclasses
+            @dataclasses.dataclass
+            class A:
+                """Test.
+
+                .. arguments::
+
+                   a [1]
+                """
+                a: int
+                b: int = 2
+        ''')
+        self.assertIsNotNone(stringly.schemacache.load(m.A))
+        stringly.serializer.cache_clear()
+        self.assertEqual(stringly.loads(m.A, 'b=3'), m.A(1, 3))
+        m = self.module('''
+            import dataclasses
+            @dataclasses.dataclass
+            class A:
+                """Test.
+
+                .. arguments::
+
+                   a [4]
+                """
+                a: int
+        ''')
+        self.assertIsNone(stringly.schemacache.load(m.A))
+        stringly.serializer.cache_clear()
+        self.assertEqual(stringly.loads(m.A, ''), m.A(4))
+
+    def test_corrupt(self):
+        m = self.module('''
+            import dataclasses
+            @dataclasses.dataclass
+            class A:
+                a: int
+        ''')
+        stringly.serializer.get(m.A)
+        paths = list((pathlib.Path(self.tmp.name) / 'cache').iterdir())
+        self.assertEqual([path.suffix for path in paths], ['.json'])
+        for data in b'garbage', b'[]', b'{"version": 2}', b'{"version": 2, "name": "stringly_schemacache_test-A", "doc": "A(a: int)", "defaults": {"a": 1}}':
+            paths[0].write_bytes(data)
+            self.assertIsNone(stringly.schemacache.load(m.A))
+        stringly.serializer.cache_clear()
+        self.assertEqual(stringly.loads(m.A, 'a=1'), m.A(1))
+
+    def test_sentinel(self):
+        m = self.module('''
+            import dataclasses
+            _MISSING = object()
+            @dataclasses.dataclass
+            class A:
+                a: int
+                b: int = _MISSING
+        ''')
+        self.assertIs(stringly.loads(m.A, 'a=1').b, m._MISSING)
+        self.assertIsNotNone(stringly.schemacache.load(m.A))
+        stringly.serializer.cache_clear()
+        self.assertIs(stringly.loads(m.A, 'a=1').b, m._MISSING)
+
+    def test_locals(self):
+        m = self.module('''
+            import dataclasses
+            def make(T):
+                @dataclasses.dataclass
+                class C:
+                    x: T
+                return C
+            A = make(int)
+            B = make(str)
+        ''')
+        self.assertEqual(stringly.loads(m.A, 'x=1'), m.A(1))
+        self.assertEqual(stringly.loads(m.B, 'x=abc'), m.B('abc'))
+        self.assertIsNone(stringly.schemacache.load(m.A))
+        self.assertFalse((pathlib.Path(self.tmp.name) / 'cache').exists())
+
+
+class Import(unittest.TestCase):
+
+    def importtime(self, source):
+        p = subprocess.run([sys.executable, '-X', 'importtime', '-c', source], cwd=pathlib.Path(__file__).parent,
+          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        return {line.split('|')[-1].strip(): int(line.split('|')[1]) for line in p.stderr.splitlines()[1:] if line.startswith('import time:')}
+
+    def test_lazy(self):
+        imported = self.importtime('import stringly')
+        self.assertIn('stringly', imported)
+        for name in 'stringly.serializer', 'stringly.util', 'inspect', 'dataclasses', 'decimal', 'pathlib', 'typing_extensions':
+            self.assertNotIn(name, imported)
+
+    def test_first_use(self):
+        imported = self.importtime('import stringly; stringly.loads(int, "1")')
+        self.assertIn('stringly.serializer', imported)
+        for name in 'stringly.compiler', 'json', 'pickle', 'hashlib', 'tempfile':
+            self.assertNotIn(name, imported)
+
+    def selftimes(self, source):
+        p = subprocess.run([sys.executable, '-X', 'importtime', '-c', source], cwd=pathlib.Path(__file__).parent,
+          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        return {line.split('|')[-1].strip(): int(line.split('|')[0].split(':')[1]) for line in p.stderr.splitlines()[1:] if line.startswith('import time:')}
+
+    def test_first_use_budget(self):
+        # The import time of everything that the first use of stringly adds to
+        # its standard library dependencies, including stringly itself, must
+        # stay well below the import time of those dependencies. The ratio is
+        # independent of the speed of the machine; the best of three runs
+        # filters out noise.
+        deps = 'import dataclasses, decimal, enum, inspect, pathlib, typing, typing_extensions'
+        ratios = []
+        for i in range(3):
+            depstimes = self.selftimes(deps)
+            times = self.selftimes(deps + '; import stringly; stringly.loads(int, "1")')
+            added = sum(t for name, t in times.items() if name not in depstimes)
+            ratios.append(added / sum(t for name, t in times.items() if name in depstimes))
+        self.assertLess(min(ratios), .35)
+
+    def test_getattr(self):
+        self.assertIs(stringly.error, sys.modules['stringly.error'])
+        self.assertIn('schemacache', dir(stringly))
+        with self.assertRaises(AttributeError):
+            stringly.nonexistent
+
+
+class Many(unittest.TestCase):
+
+    def test_loads_many(self):
+        self.assertEqual(stringly.loads_many(typing.List[int], ['1,2', '', '3']), [[1,2], [], [3]])
+
+    def test_dumps_many(self):
+        self.assertEqual(stringly.dumps_many(typing.List[int], [[1,2], [], [3]]), ['1,2', '', '3'])
+
+    def test_pretty(self):
+        t = typing.Dict[str,typing.List[int]]
+        v = [{'a': [1,2]}, {'b': [3]}]
+        s = stringly.dumps_many(t, v, pretty=True)
+        self.assertEqual(s, ['a=\n  1\n  2\n', 'b=3\n'])
+        self.assertEqual(stringly.loads_many(t, s, pretty=True), v)
+
+    def test_loads_error(self):
+        with self.assertRaisesRegex(stringly.error.SerializationError, 'item 2: ') as cm:
+            stringly.loads_many(int, ['1', '2', 'x'])
+        self.assertEqual(cm.exception.index, 2)
+        self.assertIsInstance(cm.exception.error, stringly.error.SerializationError)
+
+    def test_dumps_error(self):
+        with self.assertRaisesRegex(stringly.error.SerializationError, 'item 1: 1.5 <float> is not an instance of int or bool') as cm:
+            stringly.dumps_many(int, [1, 1.5])
+        self.assertEqual(cm.exception.index, 1)
+
+
+@dataclasses.dataclass
+class Point:
+    x: float
+    y: float = 0.
+
+
+class ManyExecutor(unittest.TestCase):
+
+    def check(self, executor):
+        values = [Point(float(i), -i) for i in range(50)]
+        strings = stringly.dumps_many(Point, values)
+        self.assertEqual(stringly.dumps_many(Point, values, executor=executor, chunksize=7), strings)
+        self.assertEqual(stringly.loads_many(Point, strings, executor=executor, chunksize=7), values)
+        strings[10] = strings[30] = 'x=a'
+        with self.assertRaisesRegex(stringly.error.ItemSerializationError, 'item 10: ') as cm:
+            stringly.loads_many(Point, strings, executor=executor, chunksize=7)
+        self.assertEqual(cm.exception.index, 10)
+
+    def test_thread(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            self.check(executor)
+
+    def test_process(self):
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            self.check(executor)
+
+
+class Stream(unittest.TestCase):
+
+    def test_iterload_list(self):
+        t = typing.List[typing.Dict[str,typing.Tuple[int,...]]]
+        v = [{'a': (1,2)}, {}, {'b,': ()}, {'c': (3,)}]
+        s = stringly.dumps(t, v)
+        for chunksize in 1, 2, 3, len(s):
+            self.assertEqual(list(stringly.iterload(t, io.StringIO(s), chunksize=chunksize)), v)
+
+    def test_iterload_dict(self):
+        t = typing.Dict[str,typing.List[str]]
+        v = {'x': ['', 'a,b'], 'y': []}
+        self.assertEqual(list(stringly.iterload(t, io.StringIO(stringly.dumps(t, v)), chunksize=2)), list(v.items()))
+
+    def test_iterload_empty(self):
+        self.assertEqual(list(stringly.iterload(typing.List[str], io.StringIO(''))), [])
+        self.assertEqual(list(stringly.iterload(typing.List[str], io.StringIO(','))), ['', ''])
+
+    def test_iterload_unsupported(self):
+        with self.assertRaises(ValueError):
+            next(stringly.iterload(int, io.StringIO('1')))
+
+    def test_dump(self):
+        t = typing.List[typing.Dict[str,typing.Tuple[int,...]]]
+        v = [{'a': (1,2)}, {}, {'b,': ()}, {'c': (3,)}]
+        for pretty in False, True:
+            f = io.StringIO()
+            stringly.dump(t, v, f, pretty=pretty)
+            self.assertEqual(f.getvalue(), stringly.dumps(t, v, pretty=pretty))
+
+
+class AsyncStream(unittest.TestCase):
+
+    class Reader:
+        def __init__(self, data):
+            self.data = data
+            self.reads = 0
+        async def read(self, size):
+            self.reads += 1
+            chunk, self.data = self.data[:size], self.data[size:]
+            return chunk
+
+    class Writer:
+        def __init__(self):
+            self.chunks = []
+        async def write(self, data):
+            self.chunks.append(data)
+
+    t = typing.List[typing.Dict[str,typing.Tuple[int,...]]]
+    v = [{'a': (1,2)}, {}, {'b,': ()}, {'c': (3,)}]
+
+    def test_aload(self):
+        s = stringly.dumps(self.t, self.v)
+        for chunksize in 1, 3, len(s):
+            self.assertEqual(asyncio.run(stringly.aload(self.t, self.Reader(s), chunksize=chunksize)), self.v)
+
+    def test_aload_pretty(self):
+        s = stringly.dumps(self.t, self.v, pretty=True)
+        self.assertEqual(asyncio.run(stringly.aload(self.t, self.Reader(s), pretty=True, chunksize=2)), self.v)
+
+    def test_aload_scalar(self):
+        self.assertEqual(asyncio.run(stringly.aload(complex, self.Reader('1+2j'), chunksize=1)), 1+2j)
+
+    def test_aload_bytes(self):
+        async def load():
+            reader = asyncio.StreamReader()
+            reader.feed_data('é,ü,'.encode())
+            reader.feed_data('ß'.encode())
+            reader.feed_eof()
+            return await stringly.aload(typing.Tuple[str,...], reader, chunksize=1)
+        self.assertEqual(asyncio.run(load()), ('é', 'ü', 'ß'))
+
+    def test_aload_executor(self):
+        s = stringly.dumps(self.t, self.v)
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            self.assertEqual(asyncio.run(stringly.aload(self.t, self.Reader(s), executor=executor, chunksize=4)), self.v)
+            self.assertEqual(asyncio.run(stringly.aload(int, self.Reader('12'), executor=executor)), 12)
+
+    def test_aiterload(self):
+        t = typing.Dict[str,int]
+        async def load():
+            return [item async for item in stringly.aiterload(t, self.Reader('a=1,b=2'), chunksize=2)]
+        self.assertEqual(asyncio.run(load()), [('a', 1), ('b', 2)])
+        async def unsupported():
+            async for item in stringly.aiterload(int, self.Reader('1')):
+                pass
+        with self.assertRaises(ValueError):
+            asyncio.run(unsupported())
+
+    def test_adump(self):
+        for pretty in False, True:
+            writer = self.Writer()
+            asyncio.run(stringly.adump(self.t, self.v, writer, pretty=pretty, chunksize=4, encoding=None))
+            self.assertGreater(len(writer.chunks), 1)
+            self.assertEqual(''.join(writer.chunks), stringly.dumps(self.t, self.v, pretty=pretty))
+
+    def test_adump_encoding(self):
+        writer = self.Writer()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            asyncio.run(stringly.adump(typing.List[str], ['é', 'ü'], writer, executor=executor))
+        self.assertEqual(b''.join(writer.chunks), 'é,ü'.encode())
+
+    def test_offload(self):
+        threads = []
+        class C(str):
+            @staticmethod
+            def __stringly_loads__(s):
+                threads.append(threading.get_ident())
+                return C(s)
+            @staticmethod
+            def __stringly_dumps__(v):
+                threads.append(threading.get_ident())
+                return str(v)
+        self.assertEqual(asyncio.run(stringly.aload(C, self.Reader('abc'))), 'abc')
+        writer = self.Writer()
+        asyncio.run(stringly.adump(C, C('abc'), writer))
+        self.assertEqual(b''.join(writer.chunks), b'abc')
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_connection(self):
+        async def roundtrip():
+            received = asyncio.get_running_loop().create_future()
+            async def handle(reader, writer):
+                received.set_result(await stringly.aload(self.t, reader, chunksize=3))
+                writer.close()
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                await stringly.adump(self.t, self.v, writer, chunksize=4)
+                writer.close()
+                await writer.wait_closed()
+                return await received
+        self.assertEqual(asyncio.run(roundtrip()), self.v)
+
+
+class CLI(unittest.TestCase):
+
+    def setUp(self):
+        @dataclasses.dataclass
+        class Mesh:
+            nelems: int
+            degree: int = 1
+        def main(mesh: Mesh, tol: float, names: typing.List[str] = ['a'], verbose: bool = False):
+            '''Solve something.
+
+            .. arguments::
+
+               mesh
+                 The mesh to solve on.
+               tol [1e-6]
+                 Tolerance.
+
+            .. presets::
+
+               fine
+                 mesh=
+                   nelems=100
+                   degree=2
+                 tol=1e-10
+            '''
+            return mesh, tol, names, verbose
+        self.Mesh = Mesh
+        self.main = main
+
+    def test_parse(self):
+        self.assertEqual(stringly.cli.parse(self.main, ['mesh=nelems=2', '--names=b,c', '--verbose', 'yes']),
+          dict(mesh=self.Mesh(2), tol=1e-6, names=['b', 'c'], verbose=True))
+
+    def test_preset(self):
+        self.assertEqual(stringly.cli.parse(self.main, ['fine', '--tol=1e-3']),
+          dict(mesh=self.Mesh(100, 2), tol=1e-3, names=['a'], verbose=False))
+        self.assertEqual(stringly.cli.parse(self.main, ['tol=1e-3', 'fine'])['tol'], 1e-10)
+
+    def test_errors(self):
+        for argv, msg in (['tol=1'], "argument 'mesh': missing mandatory argument"), \
+                         (['mesh=nelems=1', 'tol=x'], "argument 'tol': "), \
+                         (['mesh=nelems=1', 'foo=1'], "invalid argument 'foo'"), \
+                         (['coarse'], "unknown preset 'coarse'"), \
+                         (['--tol'], "missing value for argument 'tol'"):
+            with self.assertRaisesRegex(stringly.error.SerializationError, msg):
+                stringly.cli.parse(self.main, argv)
+
+    def test_run(self):
+        self.assertEqual(stringly.cli.run(self.main, ['mesh=nelems=3']), (self.Mesh(3), 1e-6, ['a'], False))
+        stderr = io.StringIO()
+        with self.assertRaises(SystemExit) as cm, contextlib.redirect_stderr(stderr):
+            stringly.cli.run(self.main, ['tol=1'], prog='solve')
+        self.assertEqual(cm.exception.code, 2)
+        self.assertEqual(stderr.getvalue(), "solve: error: argument 'mesh': missing mandatory argument\n")
+
+    def test_help(self):
+        stdout = io.StringIO()
+        with self.assertRaises(SystemExit) as cm, contextlib.redirect_stdout(stdout):
+            stringly.cli.run(self.main, ['--help'], prog='solve')
+        self.assertEqual(cm.exception.code, 0)
+        self.assertEqual(stdout.getvalue(), textwrap.dedent('''\
+            usage: solve [preset] [--name=value ...]
+
+            Solve something.
+
+            presets:
+              fine
+
+            arguments:
+              --mesh=Mesh (mandatory)
+                  The mesh to solve on.
+              --tol=float [1e-6]
+                  Tolerance.
+              --names=typing.List[str] [a]
+              --verbose=bool [False]
+            '''))
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            stringly.cli.parse(int, [])
+
+
 class DocString(unittest.TestCase):
     '''Some text.
 
@@ -517,3 +1502,21 @@ class DocString(unittest.TestCase):
     def test_presets(self):
         self.assertEqual(stringly.util.DocString(self).presets,
           {'my preset': {'foo': 'Foo{x=1,y=2}', 'bar': '2'}})
+
+    def test_cached(self):
+        self.assertIs(stringly.util.DocString(self), stringly.util.DocString(self))
+        self.assertIs(stringly.util.DocString(self).defaults, stringly.util.DocString(self).defaults)
+
+    def test_weak(self):
+        class t:
+            '''Text.
+
+            .. arguments::
+
+               a [1]
+            '''
+        self.assertEqual(stringly.util.DocString(t).defaults, {'a': '1'})
+        ref = weakref.ref(t)
+        del t
+        gc.collect()
+        self.assertIsNone(ref())